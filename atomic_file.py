@@ -0,0 +1,20 @@
+# atomic_file.py - replacing files atomically, so that readers (and interrupted writers) never leave or see a partial file.
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    '''
+    Open a temporary file next to path for writing; when the block ends, replace path with it (or, if the
+    block raised, remove it), so that path holds either its old contents or the complete new ones.
+    '''
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary_path, mode) as f:
+            yield f
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
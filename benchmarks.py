@@ -0,0 +1,256 @@
+# benchmarks.py - performance benchmarks for the game engine and the AI players.
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import timeit
+import main
+import players
+import simulate
+from time import perf_counter
+
+BASELINE_PATH = 'benchmarks_baseline.json'
+
+
+def play_games(x_class, o_class, games, grid_size=3, x_kwargs=None, o_kwargs=None, k=None):
+    '''
+    Play `games` simulated games; return ({'X': wins, 'O': wins, 'Draw': draws}, seconds, [x players], [o players]).
+    '''
+    results = {'X': 0, 'O': 0, 'Draw': 0}
+    x_players, o_players = [], []
+    time_begin = perf_counter()
+    for _ in range(games):
+        game = main.TicTacToeGame(grid_size, simulation=True, k=k)
+        x_player = x_class('X', 'X', game.view, game, **(x_kwargs or {}))
+        o_player = o_class('O', 'O', game.view, game, **(o_kwargs or {}))
+        results[game.play_game(x_player, o_player, game.view)] += 1
+        x_players.append(x_player)
+        o_players.append(o_player)
+    return results, perf_counter() - time_begin, x_players, o_players
+
+
+def bench_parallel_mcts(grid_size=3, time_budget=0.05, games=20, opponent=players.AI_Jack, worker_counts=None):
+    '''
+    Root-parallel MCTS scaling: with the same wall-clock budget per move, play AI_MCTS (serial) and then
+    AI_MCTS_Parallel with each worker count as X against `opponent`; report the search rate (iterations/second
+    over all workers) and X's score (win 1, draw 0.5) so that strength per wall-clock can be compared.
+    '''
+    if worker_counts is None:
+        worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    contenders = [('AI_MCTS', players.AI_MCTS, {})] + [(f'AI_MCTS_Parallel x{workers}', players.AI_MCTS_Parallel, {'workers': workers})
+                                                      for workers in worker_counts]
+    print(f'Root-parallel MCTS, {grid_size}x{grid_size}, {time_budget * 1000:.0f} ms/move, {games} games as X vs {opponent.__name__}:')
+    rows = []
+    for name, player_class, kwargs in contenders:
+        if kwargs:  # start the pool before timing
+            players._get_process_pool(kwargs['workers'])
+        results, seconds, x_players, _ = play_games(player_class, opponent, games, grid_size,
+                                                 x_kwargs=dict(kwargs, max_iterations=None, time_budget=time_budget))
+        moves = [stats for player in x_players for stats in player.search_stats]
+        rate = sum(stats['iterations'] for stats in moves) / sum(stats['seconds'] for stats in moves)
+        score = (results['X'] + 0.5 * results['Draw']) / games
+        rows.append({'player': name, 'iterations_per_second': round(rate), 'score': score, 'results': results, 'seconds': round(seconds, 3)})
+        print(f'  {name:<24} {rate:>10.0f} iterations/s   score {score:.3f}   {results}')
+    return rows
+
+
+def bench_rave(boards=((5, 4), (7, 5)), time_budget=0.05, games=20, rave_equivalence=300):
+    '''
+    RAVE against plain UCT with the same wall-clock budget per move: on each (grid size, k) board, AI_MCTS with
+    rave_equivalence plays `games` games as X and `games` as O against AI_MCTS without it; report RAVE's score
+    (win 1, draw 0.5) over both and each player's search rate (iterations/second).
+    '''
+    print(f'AI_MCTS RAVE (rave_equivalence={rave_equivalence}) vs UCT, {time_budget * 1000:.0f} ms/move, {games} games each way round:')
+    uct_options = {'max_iterations': None, 'time_budget': time_budget}
+    rave_options = dict(uct_options, rave_equivalence=rave_equivalence)
+    rows = []
+    for grid_size, k in boards:
+        as_x, _, rave_x, uct_o = play_games(players.AI_MCTS, players.AI_MCTS, games, grid_size, rave_options, uct_options, k)
+        as_o, _, uct_x, rave_o = play_games(players.AI_MCTS, players.AI_MCTS, games, grid_size, uct_options, rave_options, k)
+        score = (as_x['X'] + as_o['O'] + 0.5 * (as_x['Draw'] + as_o['Draw'])) / (2 * games)
+        rates = {}
+        for name, searchers in (('rave', rave_x + rave_o), ('uct', uct_o + uct_x)):
+            moves = [stats for player in searchers for stats in player.search_stats]
+            rates[name] = round(sum(stats['iterations'] for stats in moves) / sum(stats['seconds'] for stats in moves))
+        row = {'grid_size': grid_size, 'k': k, 'score': score, 'as_x': as_x, 'as_o': as_o,
+               'rave_iterations_per_second': rates['rave'], 'uct_iterations_per_second': rates['uct']}
+        rows.append(row)
+        print(f"  {grid_size}x{grid_size} k={k}   RAVE score {score:.3f}   as X {as_x}   as O {as_o}   "
+              f"{rates['rave']:>6} vs {rates['uct']:>6} iterations/s")
+    return rows
+
+
+def bench_symmetry(grid_sizes=(3, 5), iterations=2000):
+    '''
+    Symmetry merging in AI_MCTS: search the empty board with and without merge_symmetric; report the tree's
+    shape (root children, nodes within two plies, deepest node) and the search rate.
+    '''
+    print(f'AI_MCTS symmetry merging, {iterations} iterations from the empty board:')
+    rows = []
+    for grid_size in grid_sizes:
+        for merge_symmetric in (False, True):
+            game = main.TicTacToeGame(grid_size, simulation=True)
+            player = players.AI_MCTS('AI_MCTS', 'X', game.view, game, max_iterations=iterations, merge_symmetric=merge_symmetric)
+            player(game)
+            tree = player.root
+            depths = [0] * len(tree)
+            for node in range(1, len(tree)):
+                depths[node] = depths[tree.parent[node]] + 1
+            row = {'grid_size': grid_size, 'merge_symmetric': merge_symmetric, 'root_children': depths.count(1),
+                   'two_ply_nodes': depths.count(1) + depths.count(2), 'max_depth': max(depths),
+                   'iterations_per_second': round(player.search_stats[-1]['iterations_per_second'])}
+            rows.append(row)
+            print(f"  {grid_size}x{grid_size} merge_symmetric={str(merge_symmetric):<5}  root children {row['root_children']:>3}   "
+                  f"nodes within 2 plies {row['two_ply_nodes']:>4}   max depth {row['max_depth']:>2}   {row['iterations_per_second']:>6} iterations/s")
+    return rows
+
+
+def bench_primitives(grid_size=3, repeats=5):
+    '''
+    The engine primitives in main.py, timed on a mid-game position (half the cells played, no winner yet):
+    {primitive: nanoseconds per call}, the best of `repeats` timeit runs. move is timed as move + undo.
+    '''
+    game = _mid_game(grid_size)
+    empty_cell = game.get_valid_moves()[0]
+    player = game.current_player
+    primitives = {
+        'is_winner': lambda: game.is_winner('X'),
+        'get_valid_moves': game.get_valid_moves,
+        'copy': game.copy,
+        'move+undo': lambda: (game.move(empty_cell, player), game.undo()),
+        'is_winning_move': lambda: game.is_winning_move(empty_cell, player),}
+    timings = {}
+    for name, primitive in primitives.items():
+        timer = timeit.Timer(primitive)
+        number, _ = timer.autorange()
+        timings[name] = min(timer.repeat(repeats, number)) / number * 1e9
+    return timings
+
+
+def bench_mcts_rate(grid_size=3, iterations=2000, repeats=3):
+    '''
+    AI_MCTS iterations per second searching the empty board with a fresh tree, the best of `repeats` searches.
+    '''
+    best = 0.0
+    for _ in range(repeats):
+        game = main.TicTacToeGame(grid_size, simulation=True)
+        player = players.AI_MCTS('AI_MCTS', 'X', game.view, game, max_iterations=iterations)
+        player(game)
+        best = max(best, player.search_stats[-1]['iterations_per_second'])
+    return best
+
+
+def bench_matchups(grid_size=3, games=200, seed=0):
+    '''
+    Full-game throughput of TicTacToeSimulator.simulate per matchup (games per second, single process, seeded).
+    The searching players play fewer games (AI_MCTS at 100 iterations per move); AI_Negamax and AI_Table only 3x3.
+    '''
+    matchups = [('AI_Rando', 'AI_Rando', games), ('AI_Jack', 'AI_Jack', games), ('AI_Jack', 'AI_Rando', games),
+                ('AI_MCTS', 'AI_Jack', max(2, games // 50))]
+    if grid_size == 3:
+        matchups += [('AI_Negamax', 'AI_Jack', max(2, games // 10)), ('AI_Table', 'AI_Jack', games)]
+    simulator = simulate.TicTacToeSimulator(grid_size, seed=seed, player_options={'AI_MCTS': {'max_iterations': 100}})
+    throughput = {}
+    for x_name, o_name, episodes in matchups:
+        time_begin = perf_counter()
+        simulator.simulate(simulator.player_classes[x_name], simulator.player_classes[o_name], episodes)
+        throughput[f'{x_name} vs {o_name}'] = episodes / (perf_counter() - time_begin)
+    return throughput
+
+
+def run_suite(grid_sizes=(3, 5, 7, 9), games=200, mcts_iterations=2000):
+    '''
+    The micro- and macro-benchmarks for each grid size, as {name: {'value': v, 'unit': u, 'higher_is_better': b}}
+    with names like '5x5/primitives/copy', '5x5/mcts' and '5x5/games/AI_Jack vs AI_Rando'.
+    '''
+    suite = {}
+    for grid_size in grid_sizes:
+        board = f'{grid_size}x{grid_size}'
+        print(f'{board}:')
+        for name, nanoseconds in bench_primitives(grid_size).items():
+            suite[f'{board}/primitives/{name}'] = {'value': round(nanoseconds, 1), 'unit': 'ns/call', 'higher_is_better': False}
+        rate = bench_mcts_rate(grid_size, mcts_iterations)
+        suite[f'{board}/mcts'] = {'value': round(rate), 'unit': 'iterations/s', 'higher_is_better': True}
+        for name, games_per_second in bench_matchups(grid_size, games).items():
+            suite[f'{board}/games/{name}'] = {'value': round(games_per_second, 2), 'unit': 'games/s', 'higher_is_better': True}
+        for name, row in suite.items():
+            if name.startswith(f'{board}/'):
+                print(f"  {name[len(board) + 1:]:<36} {row['value']:>14,} {row['unit']}")
+    return suite
+
+
+def save_baseline(suite, path=BASELINE_PATH):
+    with open(path, 'w') as f:
+        json.dump({'recorded_at': datetime.datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                   'machine': platform.platform(), 'results': suite}, f, indent=4)
+
+
+def compare_to_baseline(suite, path=BASELINE_PATH, threshold=0.15):
+    '''
+    Print each benchmark's change against the baseline at path; return the names of those that got worse by more
+    than threshold (a fraction: 0.15 is 15% slower, or 15% less throughput).
+    '''
+    with open(path, 'r') as f:
+        baseline = json.load(f)
+    print(f"Compared with the baseline of {baseline['recorded_at']} ({baseline['machine']}), threshold {threshold:.0%}:")
+    regressions = []
+    for name, row in suite.items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['value']
+        change = (row['value'] - before) / before if before else 0.0
+        worse = -change if row['higher_is_better'] else change
+        flag = ''
+        if worse > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"  {name:<42} {before:>14,} -> {row['value']:>14,} {row['unit']:<13} {change:+7.1%}{flag}")
+    return regressions
+
+
+def _mid_game(grid_size, seed=0):
+    '''
+    A game with about half the cells played at random, stopping short of any winning move.
+    '''
+    rng = random.Random(seed)
+    game = main.TicTacToeGame(grid_size, simulation=True)
+    for _ in range(grid_size * grid_size // 2):
+        moves = [cell for cell in game.get_valid_moves() if not game.is_winning_move(cell, game.current_player)]
+        if not moves:
+            break
+        game.move(rng.choice(moves), game.current_player)
+    return game
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tic-Tac-Toe performance benchmarks')
+    parser.add_argument('--grid-size', type=int, default=3)
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--time-budget', type=float, default=0.05, help='seconds per MCTS move')
+    parser.add_argument('--workers', type=int, nargs='*', help='worker counts for the parallel MCTS benchmark')
+    parser.add_argument('--only', choices=['suite', 'parallel', 'symmetry', 'rave'], help='run just one benchmark')
+    parser.add_argument('--rave-equivalence', type=int, default=300, help="AI_MCTS's rave_equivalence for the RAVE benchmark")
+    parser.add_argument('--suite-grid-sizes', type=int, nargs='*', default=[3, 5, 7, 9], help='grid sizes for the benchmark suite')
+    parser.add_argument('--suite-games', type=int, default=200, help='games per matchup in the benchmark suite')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='the baseline JSON to compare the suite with')
+    parser.add_argument('--save-baseline', action='store_true', help="save the suite's results as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.15, help='the fraction by which a benchmark may get worse before it is flagged')
+    args = parser.parse_args()
+    regressions = []
+    if args.only in (None, 'suite'):
+        suite = run_suite(args.suite_grid_sizes, args.suite_games)
+        if args.save_baseline:
+            save_baseline(suite, args.baseline)
+            print(f'Saved the baseline to {args.baseline}')
+        elif os.path.exists(args.baseline):
+            regressions = compare_to_baseline(suite, args.baseline, args.threshold)
+    if args.only in (None, 'parallel'):
+        bench_parallel_mcts(args.grid_size, args.time_budget, args.games, worker_counts=args.workers)
+    if args.only in (None, 'symmetry'):
+        bench_symmetry()
+    if args.only in (None, 'rave'):
+        bench_rave(time_budget=args.time_budget, games=args.games, rave_equivalence=args.rave_equivalence)
+    if regressions:
+        raise SystemExit(f'{len(regressions)} benchmark(s) regressed beyond {args.threshold:.0%}: {", ".join(regressions)}')
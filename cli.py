@@ -0,0 +1,273 @@
+# cli.py - the non-interactive command line: play, simulate, tournament, present and plot, driven by flags or a JSON config.
+#
+#   python cli.py play --x AI_Jack --o AI_MCTS --games 3
+#   python cli.py play --x Human --o AI_MCTS --grid-size 15 --k 5 --player-option AI_MCTS.time_budget=1
+#   python cli.py simulate --x AI_Rando --o AI_Jack --episodes 1000 --workers 4 --seed 1 --record-latency
+#   python cli.py tournament --episodes 200 --seed 1          (re-run the same command to resume after an interruption)
+#   python cli.py --config tournament.json tournament
+#   python cli.py present --by-ply
+#   python cli.py plot --output results.png
+#
+# A config file holds argument values by their long option names (with underscores), e.g.
+#   {"grid_size": 3, "seed": 1, "player_options": {"AI_MCTS": {"time_budget": 0.05}}, "tournament": {"episodes": 500}}
+# where top-level keys apply to every subcommand and a subcommand's own section overrides them; flags given on the
+# command line override both. The game modules are imported by the subcommands that need them, and NumPy and
+# matplotlib only by the features that use them, so that the command starts quickly.
+import argparse
+import datetime
+import json
+import os
+import sys
+
+COMMANDS = ('play', 'simulate', 'tournament', 'present', 'plot')
+CHECKPOINT_PATH = 'tournament_checkpoint.json'
+
+
+def command_play(args):
+    '''
+    Play --games games between two players (either may be Human), showing the board unless --quiet.
+    '''
+    import main
+    import random
+    x_class, o_class = player_class(args.x), player_class(args.o)
+    interactive = 'Human' in (args.x, args.o)
+    if args.seed is not None:
+        random.seed(args.seed)
+    main.TURN_PAUSE = args.pause
+    tallies = {'X': 0, 'O': 0, 'Draw': 0}
+    for _ in range(args.games):
+        game = main.TicTacToeGame(args.grid_size, simulation=not interactive, cols=args.cols, k=args.k)
+        viewer = game.view if args.quiet and not interactive else main.Console_Viewer(game)
+        x_player = x_class(args.x, 'X', viewer, game, **args.player_options.get(args.x, {}))
+        o_player = o_class(args.o, 'O', viewer, game, **args.player_options.get(args.o, {}))
+        tallies[game.play_game(x_player, o_player, viewer)] += 1
+    print(f'{args.x}(X) vs. {args.o}(O), {args.games} game(s): {tallies}')
+
+
+def command_simulate(args):
+    '''
+    Simulate --episodes games of one matchup and record them in the results store.
+    '''
+    simulator = make_simulator(args)
+    x_class, o_class = player_class(args.x), player_class(args.o)
+    if args.batch:
+        results = simulator.simulate_batch(x_class, o_class, args.episodes)
+    else:
+        results = simulator.simulate(x_class, o_class, args.episodes)
+    simulator.save_results(x_class, o_class, results)
+    print(f'{args.x}(X) vs. {args.o}(O): {summarize(results)}')
+
+
+def command_tournament(args):
+    '''
+    Simulate --episodes games of every pairing (both ways round, and each player against itself) of --players
+    (default: all of TicTacToeSimulator.player_classes), recording each pairing in the results store and then in
+    the checkpoint file, so that running the same command again resumes with the first unfinished pairing.
+    Each batch is tagged in the store with the tournament's id, so a pairing recorded just before an
+    interruption (but not yet checkpointed) is not played again. Players that do not support the board
+    are left out of the default players.
+    '''
+    simulator = make_simulator(args)
+    names = args.players or sorted(simulator.player_classes)
+    if not args.players and simulator.unsupported_players:
+        print(f'Leaving out {", ".join(simulator.unsupported_players)}: not playable on this board')
+    geometry = make_geometry(args)
+    for name in names:
+        if not player_class(name).supports(geometry):
+            sys.exit(f'{name} cannot play on this board')
+    config = {'grid_size': args.grid_size, 'k': args.k, 'episodes': args.episodes, 'players': names, 'seed': args.seed,
+              'player_options': args.player_options, 'results': os.path.abspath(args.results)}
+    if args.cols is not None: # (so that square-board checkpoints written before --cols still resume)
+        config['cols'] = args.cols
+    checkpoint = {'config': config, 'completed': []}
+    if os.path.exists(args.checkpoint) and not args.fresh:
+        with open(args.checkpoint, 'r') as f:
+            saved = json.load(f)
+        if saved['config'] != config:
+            sys.exit(f'{args.checkpoint} is for a different tournament; use --fresh to start over, or another --checkpoint')
+        checkpoint = saved
+    if 'id' not in checkpoint: # written before any pairing is played, so every batch of the tournament carries it
+        checkpoint['id'] = f'{datetime.datetime.now().isoformat(timespec="microseconds")}-{os.getpid()}'
+        write_checkpoint(checkpoint, args.checkpoint)
+    pairings = [(x_name, o_name) for x_name in names for o_name in names]
+    completed = set(checkpoint['completed']) | recorded_pairings(args.results, checkpoint['id'])
+    remaining = [pairing for pairing in pairings if matchup_key(*pairing) not in completed]
+    if len(remaining) < len(pairings):
+        print(f'Resuming from {args.checkpoint}: {len(pairings) - len(remaining)} of {len(pairings)} pairings done')
+    for number, (x_name, o_name) in enumerate(remaining, start=len(pairings) - len(remaining) + 1):
+        x_class, o_class = player_class(x_name), player_class(o_name)
+        results = simulator.simulate(x_class, o_class, args.episodes)
+        simulator.save_results(x_class, o_class, results, extra={'tournament': checkpoint['id']})
+        checkpoint['completed'].append(matchup_key(x_name, o_name))
+        write_checkpoint(checkpoint, args.checkpoint)
+        print(f'[{number}/{len(pairings)}] {x_name}(X) vs. {o_name}(O): {summarize(results)}')
+    print(f'Tournament complete: {len(pairings)} pairings of {args.episodes} episodes recorded in {args.results}')
+
+
+def command_present(args):
+    import presenter
+    presenter.ResultsPresenter(args.results)(args.by_ply)
+
+
+def command_plot(args):
+    import plotter
+    results_plotter = plotter.ResultsPlotter(args.results)
+    results_plotter.load_results()
+    if not results_plotter.results:
+        sys.exit(f'No results found in {args.results}')
+    figure = results_plotter.plot(show=args.output is None)
+    if args.output:
+        figure.savefig(args.output, bbox_inches='tight')
+        print(f'Wrote {args.output}')
+
+
+def make_simulator(args):
+    import simulate
+    return simulate.TicTacToeSimulator(args.grid_size, args.episodes, args.workers, args.seed, args.chunk_size, args.results,
+                                       args.player_options, args.record_games, args.record_latency, args.k, args.cols)
+
+
+def make_geometry(args):
+    import main
+    return main.GridGeometry.for_size(args.grid_size, args.cols, args.k)
+
+
+def recorded_pairings(results_path, tournament_id):
+    '''
+    The matchup keys of the pairings recorded in the store at results_path for the tournament tournament_id.
+    '''
+    if not os.path.exists(results_path):
+        return set()
+    import results_store
+    with results_store.ResultsStore(results_path) as store:
+        return {matchup_key(batch['x_player'], batch['o_player']) for batch in store.iter_batches()
+                if (batch['extra'] or {}).get('tournament') == tournament_id}
+
+
+def player_class(name):
+    '''
+    The player class called name (any BasePlayer subclass in players.py, e.g. AI_Jack, AI_MCTS_Parallel or Human).
+    '''
+    import players
+    found = getattr(players, name, None)
+    if not (isinstance(found, type) and issubclass(found, players.BasePlayer) and found is not players.BasePlayer):
+        sys.exit(f'Unknown player {name!r}')
+    return found
+
+
+def matchup_key(x_name, o_name):
+    return f'{x_name}(X) vs. {o_name}(O)'
+
+
+def summarize(results):
+    return {key: value for key, value in results.items() if key in ('X', 'O', 'Draw', 'Time')}
+
+
+def write_checkpoint(checkpoint, path):
+    from atomic_file import atomic_write
+    with atomic_write(path) as f: # an interruption leaves either the old checkpoint or the new one
+        json.dump(checkpoint, f, indent=4)
+
+
+def parse_player_option(text):
+    '''
+    'AI_MCTS.time_budget=0.05' -> ('AI_MCTS', 'time_budget', 0.05); the value is read as JSON if it can be.
+    '''
+    try:
+        target, value = text.split('=', 1)
+        name, option = target.split('.', 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected PLAYER.OPTION=VALUE, not {text!r}')
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return name, option, value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Tic-Tac-Toe: play, simulate and compare the AI players')
+    parser.add_argument('--config', help='a JSON file of argument values (see the top of cli.py)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(subparser, players=True):
+        subparser.add_argument('--grid-size', type=int, default=3, help='the number of rows (and of columns, unless --cols is given)')
+        subparser.add_argument('--cols', type=int, help='the number of columns, for an m x n board (e.g. --grid-size 6 --cols 7 --k 4)')
+        subparser.add_argument('--k', type=int, help='the number in a row that wins (default: the whole row, e.g. --grid-size 15 --k 5)')
+        subparser.add_argument('--seed', type=int, help='seed the random moves, for reproducible runs')
+        if players:
+            subparser.add_argument('--player-option', action='append', type=parse_player_option, default=[], metavar='PLAYER.OPTION=VALUE',
+                                   help="a keyword argument for a player class, e.g. AI_MCTS.time_budget=0.05 (repeatable)")
+
+    def add_simulation(subparser):
+        add_common(subparser)
+        subparser.add_argument('--episodes', type=int, default=100)
+        subparser.add_argument('--workers', type=int, default=1, help='worker processes')
+        subparser.add_argument('--chunk-size', type=int, default=100, help='episodes per seeded chunk')
+        subparser.add_argument('--record-games', action='store_true', help="record each game's outcome and time")
+        subparser.add_argument('--record-latency', action='store_true', help="record each player's decision time by ply")
+        subparser.add_argument('--results', default='results.db', help='the results store')
+
+    play = subparsers.add_parser('play', help='play games, showing the board (Human players play on the console)')
+    add_common(play)
+    play.add_argument('--x', default='AI_Jack', help='the X player class')
+    play.add_argument('--o', default='AI_Rando', help='the O player class')
+    play.add_argument('--games', type=int, default=1)
+    play.add_argument('--pause', type=float, default=0.0, help='seconds between plays when a Human is playing')
+    play.add_argument('--quiet', action='store_true', help='only print the tallies')
+    play.set_defaults(handler=command_play)
+
+    simulate = subparsers.add_parser('simulate', help='simulate one matchup and record the results')
+    add_simulation(simulate)
+    simulate.add_argument('--x', default='AI_Jack', help='the X player class')
+    simulate.add_argument('--o', default='AI_Rando', help='the O player class')
+    simulate.add_argument('--batch', action='store_true', help='play all episodes in lock-step with NumPy (AI_Rando and AI_Jack only)')
+    simulate.set_defaults(handler=command_simulate)
+
+    tournament = subparsers.add_parser('tournament', help='simulate every pairing of the players, resumably')
+    add_simulation(tournament)
+    tournament.add_argument('--players', nargs='*', help='the player classes (default: all of the simulator\'s)')
+    tournament.add_argument('--checkpoint', default=CHECKPOINT_PATH, help='the progress file to resume from')
+    tournament.add_argument('--fresh', action='store_true', help='ignore (and replace) an existing checkpoint')
+    tournament.set_defaults(handler=command_tournament)
+
+    present = subparsers.add_parser('present', help='print the recorded results')
+    present.add_argument('--results', default='results.db', help='the results store (or a results.json file)')
+    present.add_argument('--by-ply', action='store_true', help='show the decision latencies for each ply')
+    present.set_defaults(handler=command_present)
+
+    plot = subparsers.add_parser('plot', help='graph the recorded results (needs matplotlib)')
+    plot.add_argument('--results', default='results.db', help='the results store (or a results.json file)')
+    plot.add_argument('--output', help='save the graph to this file instead of showing it')
+    plot.set_defaults(handler=command_plot)
+    return parser, subparsers
+
+
+def parse_args(argv=None):
+    '''
+    Parse argv, taking the defaults from the --config file if there is one.
+    '''
+    parser, subparsers = build_parser()
+    config_parser = argparse.ArgumentParser(add_help=False)
+    config_parser.add_argument('--config')
+    config_path = config_parser.parse_known_args(argv)[0].config
+    config = {}
+    if config_path:
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    for command, subparser in subparsers.choices.items():
+        defaults = {key: value for key, value in config.items() if key not in COMMANDS}
+        defaults.update(config.get(command, {}))
+        subparser.set_defaults(**defaults)
+    args = parser.parse_args(argv)
+    # the config's player_options, overridden by any --player-option flags
+    player_options = {name: dict(options) for name, options in getattr(args, 'player_options', {}).items()}
+    for name, option, value in getattr(args, 'player_option', []):
+        player_options.setdefault(name, {})[option] = value
+    args.player_options = player_options
+    return args
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    arguments.handler(arguments)
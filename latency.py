@@ -0,0 +1,142 @@
+# latency.py - per-move decision times: mergeable log-scale histograms per player and ply.
+import math
+
+SUB_BUCKETS = 8 # buckets per power of two, so a bucket spans at most 1/8 of its values (12.5% resolution)
+QUANTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+
+
+class LatencyHistogram:
+    '''
+    LatencyHistogram:   counts of durations (nanoseconds) in log-linear buckets: exact below 2 * SUB_BUCKETS,
+                        then SUB_BUCKETS buckets per power of two. Histograms merge by adding counts, so
+                        they can be built in worker processes and combined; the maximum is kept exactly.
+    '''
+    __slots__ = ('counts', 'count', 'max')
+
+    def __init__(self) -> None:
+        self.counts = {}
+        self.count = 0
+        self.max = 0
+
+    @staticmethod
+    def bucket(nanoseconds: int) -> int:
+        shift = nanoseconds.bit_length() - 4
+        if shift <= 0:
+            return nanoseconds
+        return shift * SUB_BUCKETS + (nanoseconds >> shift)
+
+    @staticmethod
+    def bucket_range(bucket: int):
+        '''
+        The (lowest, highest) durations that fall in bucket.
+        '''
+        if bucket < 2 * SUB_BUCKETS:
+            return bucket, bucket
+        shift = bucket // SUB_BUCKETS - 1
+        low = (bucket % SUB_BUCKETS + SUB_BUCKETS) << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, nanoseconds: int) -> None:
+        bucket = self.bucket(nanoseconds)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+
+    def merge(self, other) -> None:
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        '''
+        The q-quantile (nanoseconds): the midpoint of the bucket holding it, capped at the maximum.
+        '''
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                low, high = self.bucket_range(bucket)
+                return min((low + high) / 2, self.max)
+        return float(self.max)
+
+    def to_json(self) -> dict:
+        '''
+        {'counts': {bucket: count}, 'max': ns}, from which from_json rebuilds the histogram (e.g. to merge it with later ones).
+        '''
+        return {'counts': self.counts, 'max': self.max}
+
+    @classmethod
+    def from_json(cls, data):
+        histogram = cls()
+        histogram.counts = {int(bucket): count for bucket, count in data['counts'].items()} # JSON keys are strings
+        histogram.count = sum(histogram.counts.values())
+        histogram.max = data['max']
+        return histogram
+
+    def summary(self) -> dict:
+        '''
+        {'count': n, 'p50': µs, 'p95': µs, 'p99': µs, 'max': µs}
+        '''
+        summary = {'count': self.count}
+        for name, q in QUANTILES.items():
+            summary[name] = round(self.quantile(q) / 1000, 3)
+        summary['max'] = round(self.max / 1000, 3)
+        return summary
+
+
+class LatencyRecorder:
+    '''
+    LatencyRecorder:    the decision times of each player (e.g. 'AI_MCTS(X)') by ply, as LatencyHistograms;
+                        pass one to TicTacToeGame.play_game to time every move of the game.
+    '''
+    def __init__(self) -> None:
+        self.histograms = {} # player -> {ply: LatencyHistogram}
+
+    def record(self, player: str, ply: int, nanoseconds: int) -> None:
+        plies = self.histograms.get(player)
+        if plies is None:
+            plies = self.histograms[player] = {}
+        histogram = plies.get(ply)
+        if histogram is None:
+            histogram = plies[ply] = LatencyHistogram()
+        histogram.record(nanoseconds)
+
+    def merge(self, other) -> None:
+        for player, plies in other.histograms.items():
+            for ply, histogram in plies.items():
+                self.histograms.setdefault(player, {}).setdefault(ply, LatencyHistogram()).merge(histogram)
+
+    def to_json(self) -> dict:
+        '''
+        {player: {ply: LatencyHistogram.to_json()}}, which (unlike summary()'s percentiles) can be merged later on.
+        '''
+        return {player: {ply: histogram.to_json() for ply, histogram in sorted(plies.items())} for player, plies in sorted(self.histograms.items())}
+
+    @classmethod
+    def from_json(cls, data):
+        recorder = cls()
+        recorder.histograms = {player: {int(ply): LatencyHistogram.from_json(histogram) for ply, histogram in plies.items()}
+                               for player, plies in data.items()}
+        return recorder
+
+    def summary(self) -> dict:
+        '''
+        Per player, the percentiles (µs) over all its moves and by ply:
+        {player: {'all': {'count', 'p50', 'p95', 'p99', 'max'}, 'plies': {ply: {...}}}}
+        '''
+        summary = {}
+        for player, plies in sorted(self.histograms.items()):
+            overall = LatencyHistogram()
+            for histogram in plies.values():
+                overall.merge(histogram)
+            summary[player] = {'all': overall.summary(), 'plies': {ply: plies[ply].summary() for ply in sorted(plies)}}
+        return summary
+
+
+def player_key(player) -> str:
+    return f'{type(player).__name__}({player.player_symbol})'
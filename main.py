@@ -1,8 +1,12 @@
 #  main.py - Tic-Tac-Toe game Class for interactive play and simulation, 
 #  ostensibly for Machine Learning and statistical analysis.
-from players import Human, AI_Jack, AI_Rando, AI_MCTS
-from time import sleep
-from typing import List
+from latency import player_key
+from players import Human, AI_Jack, AI_Rando, AI_MCTS, AI_Negamax
+from time import perf_counter_ns, sleep
+from typing import List, Tuple
+
+TURN_PAUSE = 0.4 #  DEBUG?: to allow for slowed-play (i.e. execute main.py and run AI vs AI games)
+GEOMETRY_ALIASES = ('score_matrix', 'win_masks', 'cell_win_masks', 'cell_lines', 'full_mask') # GridGeometry tables a TicTacToeGame keeps as attributes
 
 
 class BaseViewer:
@@ -14,7 +18,12 @@ class BaseViewer:
                     __call__(self)          - update the view of the game board state
                     
                     message(self, message)  - print a message to the user
+
+                    wants_messages          - False if the viewer discards messages, so callers 
+                                              can skip building them
     '''
+    wants_messages = True
+
     def __init__(self, game) -> None:
         self.game = game
     
@@ -66,6 +75,8 @@ class Console_Viewer(BaseViewer):
                 
             
 class Simulation_Viewer(BaseViewer):
+    wants_messages = False
+
     def __call__(self) -> None:
         pass
         
@@ -79,111 +90,294 @@ class Simulation_Viewer(BaseViewer):
         print(message)
 
 
+class GridGeometry:
+    '''
+    GridGeometry:   the immutable description of an (m, n, k) board, m rows by n columns won by k in a row 
+                    (tic-tac-toe is (3, 3, 3); by default n = m and k = n, so a win fills a whole row, column 
+                    or diagonal), shared (flyweight) by every TicTacToeGame on that board; use 
+                    GridGeometry.for_size(grid_size, cols, k).
+
+                    score_matrix    - the number of ways to win from each cell, [row][col]
+                    win_masks       - the bitmask of every line: each run of k cells along a row, column 
+                                      or diagonal (a whole row, column or diagonal when k = n = m)
+                    cell_win_masks  - per cell (bit index), the masks of the lines through it
+                    cell_lines      - per cell (bit index), the indices of the lines through it
+                    label_coords    - per cell (bit index), the (row, col) of that cell
+                    coord_labels    - [row][col], the cell label (1-based)
+                    score_groups    - the cells as bitmasks grouped by score, highest score first
+                    move_order      - the cell labels ordered by score, highest first (then by label)
+                    symmetries      - the rotations/reflections of the board as cell permutations (8 for a 
+                                      square board, 4 otherwise), symmetry[cell] being the image of cell 
+                                      (bit index); identity first
+                    inverse_symmetries - the inverse permutation of each of the symmetries
+    '''
+    _cache = {}
+    DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+    def __init__(self, grid_size: int, cols: int = None, k: int = None) -> None:
+        rows = grid_size
+        cols = rows if cols is None else cols
+        k = max(rows, cols) if k is None else k
+        assert 1 < k <= max(rows, cols), f'k ({k}) must be between 2 and the length of the board'
+        self.grid_size = self.rows = rows
+        self.cols = cols
+        self.k = k
+        self.key = (rows, cols, k)
+        self.cells = rows * cols
+        self.full_mask = (1 << self.cells) - 1
+        lines = []
+        for row in range(rows):
+            for col in range(cols):
+                for d_row, d_col in self.DIRECTIONS:
+                    end_row, end_col = row + d_row * (k - 1), col + d_col * (k - 1)
+                    if 0 <= end_row < rows and 0 <= end_col < cols:
+                        lines.append([(row + d_row * i, col + d_col * i) for i in range(k)])
+        self.win_masks = tuple(sum(1 << (row * cols + col) for row, col in line) for line in lines)
+        self.cell_win_masks = tuple(tuple(mask for mask in self.win_masks if mask >> cell & 1) for cell in range(self.cells))
+        self.cell_lines = tuple(tuple(idx for idx, mask in enumerate(self.win_masks) if mask >> cell & 1) for cell in range(self.cells))
+        if rows == cols == k and rows % 2 == 1:
+            self.score_matrix = self._generate_score_matrix(rows)
+        else:
+            self.score_matrix = tuple(tuple(len(self.cell_lines[row * cols + col]) for col in range(cols)) for row in range(rows))
+        self.label_coords = tuple(divmod(cell, cols) for cell in range(self.cells))
+        self.coord_labels = tuple(tuple(row * cols + col + 1 for col in range(cols)) for row in range(rows))
+        scores = sorted({score for row in self.score_matrix for score in row}, reverse=True)
+        self.score_groups = tuple(sum(1 << cell for cell in range(self.cells) if self.score_matrix[cell // cols][cell % cols] == score) for score in scores)
+        self.move_order = tuple(sorted(range(1, self.cells + 1), key=lambda label: -self.score_matrix[(label - 1) // cols][(label - 1) % cols]))
+        last_row, last_col = rows - 1, cols - 1
+        if rows == cols:
+            last = last_row
+            transforms = [lambda r, c: (r, c), lambda r, c: (c, last - r), lambda r, c: (last - r, last - c), lambda r, c: (last - c, r),
+                          lambda r, c: (r, last - c), lambda r, c: (last - r, c), lambda r, c: (c, r), lambda r, c: (last - c, last - r)]
+        else: # no quarter turns or diagonal reflections
+            transforms = [lambda r, c: (r, c), lambda r, c: (last_row - r, last_col - c), lambda r, c: (r, last_col - c), lambda r, c: (last_row - r, c)]
+        self.symmetries = tuple(tuple(row * cols + col for row, col in (transform(*divmod(cell, cols)) for cell in range(self.cells))) for transform in transforms)
+        self.inverse_symmetries = tuple(tuple(sorted(range(self.cells), key=symmetry.__getitem__)) for symmetry in self.symmetries)
+
+    @classmethod
+    def for_size(cls, grid_size: int, cols: int = None, k: int = None) -> 'GridGeometry':
+        cols = grid_size if cols is None else cols
+        key = (grid_size, cols, max(grid_size, cols) if k is None else k)
+        if key not in cls._cache:
+            cls._cache[key] = cls(*key)
+        return cls._cache[key]
+
+    @staticmethod
+    def _generate_score_matrix(grid_size) -> Tuple[Tuple[int, ...], ...]:
+        '''
+        Generate a score matrix for the game board, where the score is the number of ways to win from that cell.
+        '''
+        matrix = [[0 for _ in range(grid_size)] for _ in range(grid_size)]
+        for row in range(grid_size):
+            for col in range(grid_size):
+                score = 2          
+                if row == col and (row == 0 or row == grid_size - 1 or row == grid_size // 2):
+                    score += 1
+                if row + col == grid_size - 1 and (row == 0 or row == grid_size - 1 or row == grid_size // 2):
+                    score += 1
+                matrix[row][col] = score
+        return tuple(tuple(row) for row in matrix)
+
+    def __reduce__(self):
+        return (GridGeometry.for_size, self.key)
+
+    def canonical(self, x_mask: int, o_mask: int) -> Tuple[Tuple[int, int], int]:
+        '''
+        Return the canonical form of a position, the smallest (x_mask, o_mask) among its images under the 
+        symmetries, and the index of the symmetry that maps the position onto it.
+        '''
+        best_image, best_index = None, 0
+        for index, symmetry in enumerate(self.symmetries):
+            image = (self.transform_mask(x_mask, symmetry), self.transform_mask(o_mask, symmetry))
+            if best_image is None or image < best_image:
+                best_image, best_index = image, index
+        return best_image, best_index
+
+    def transform_mask(self, mask: int, symmetry: Tuple[int, ...]) -> int:
+        '''
+        Return the image of a cell bitmask under one of the symmetries.
+        '''
+        image = 0
+        while mask:
+            low_bit = mask & -mask
+            image |= 1 << symmetry[low_bit.bit_length() - 1]
+            mask ^= low_bit
+        return image
+
+
 class TicTacToeGame:    
     '''
     class TicTacToeGame - the game board and state, including the current player, 
     and the 'score matrix' which is a tool used to evaluate each cell based on  
     its strategic value; for use by AIs.
+
+    The board is grid_size x grid_size (or grid_size rows by cols columns), won by k in 
+    a row (by default, a whole row, column or diagonal); see GridGeometry.
+
+    The board is held as one integer bitmask per player (bit `label - 1` is set when 
+    that player has claimed the cell), and the winning lines are precomputed masks, 
+    so win checks are a few AND/compare operations and a copy is two ints.
+
+    Each move also updates per-line piece counters and a move counter, so the game's 
+    status is known as soon as the move is made: 'outcome' is None while the game is in 
+    progress, else 'X', 'O' or 'Draw'. Only the lines through the cell played are touched 
+    (at most 4k of them), so a move costs O(k) however large the board.
+
+    The same counters maintain 'threats', per player the cells that would complete a line 
+    for them (cell label -> the number of such lines), so winning and blocking moves are 
+    found by lookup rather than by testing every empty cell.
+
+    Everything that depends only on the board lives in a shared GridGeometry, so copy() 
+    only duplicates the mutable state (masks, counters, current player and outcome).
+
+    Moves are recorded on a move stack ('history'), and undo() takes back the last one, 
+    restoring the previous state exactly; searches can play out and roll back a line on 
+    a single state instead of copying it for every step.
     '''
-    def __init__(self, grid_size: int, simulation: bool) -> None:
+    def __init__(self, grid_size: int, simulation: bool, cols: int = None, k: int = None) -> None:
         self.AI_ONLY_MODE = not simulation
         self.conclusion = str
         self.grid_size = grid_size
-        self.score_matrix = self._generate_score_matrix(grid_size)
-        self.board = self._generate_board()
-        self.current_player = 'X' #  First player is X
+        self.geometry = GridGeometry.for_size(grid_size, cols, k)
+        self.k = self.geometry.k
+        self.alias_geometry()
+        self.reset()
         self.simulation = simulation
         if simulation:
             self.view = Simulation_Viewer(self)
         else:
             self.view = Console_Viewer(self)
+        self.wants_messages = self.view.wants_messages # players check this before composing a message
         
+    def alias_geometry(self) -> None:
+        '''
+        Make the geometry's tables attributes of the game, for quicker lookup in the hot loops.
+        '''
+        for name in GEOMETRY_ALIASES:
+            setattr(self, name, getattr(self.geometry, name))
+
+    def __getstate__(self) -> dict:
+        '''
+        Pickle the game without the aliases of the geometry's tables: the geometry pickles as its key, and
+        the unpickled game aliases the tables of that process's shared GridGeometry.
+        '''
+        state = self.__dict__.copy()
+        for name in GEOMETRY_ALIASES:
+            del state[name]
+        return state
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self.alias_geometry()
+
     def __str__(self) -> str:
-        board_with_labels = [[f'{(row_idx * self.grid_size) + col_idx + 1:3d}' if cell == ' ' else f'{cell:^3s}' for col_idx, cell in enumerate(row)] for row_idx, row in enumerate(self.board)]
+        board_with_labels = [[f'{self.geometry.coord_labels[row_idx][col_idx]:3d}' if cell == ' ' else f'{cell:^3s}' for col_idx, cell in enumerate(row)] for row_idx, row in enumerate(self.board)]
         formatted_board = []
         for i, row in enumerate(board_with_labels):
             formatted_row = ' | '.join(row)
-            if i < self.grid_size - 1:
-                formatted_row += '\n' + '-' * (6 * game.grid_size - 3)
+            if i < self.geometry.rows - 1:
+                formatted_row += '\n' + '-' * (6 * self.geometry.cols - 3)
             formatted_board.append(formatted_row)
         return "\n".join(formatted_board)
-    
-    def _count_claimed_cells_in_line(self, player, coords) -> int:
-        count = 0
-        for x, y in coords:
-            if self.board[x][y] == player:
-                count += 1
-        return count
-    
-    def _generate_board(self):
-        return [[' ' for _ in range(self.grid_size)] for _ in range(self.grid_size)]              
-        
-    def _generate_score_matrix(self, grid_size) -> List[List[int]]:
+
+    @property
+    def board(self) -> List[List[str]]:
         '''
-        Generate a score matrix for the game board, where the score is the number of ways to win from that cell.
+        The board as a list of rows of ' '/'X'/'O' strings (rendered from the bitmasks).
         '''
-        assert grid_size % 2 == 1, "Grid size should be odd, comment-out this line if you feel otherwise (and good luck!)"
-        matrix = [[0 for _ in range(grid_size)] for _ in range(grid_size)]
-        for row in range(grid_size):
-            for col in range(grid_size):
-                score = 2          
-                if row == col and (row == 0 or row == grid_size - 1 or row == grid_size // 2):
-                    score += 1
-                if row + col == grid_size - 1 and (row == 0 or row == grid_size - 1 or row == grid_size // 2):
-                    score += 1
-                matrix[row][col] = score
-        return matrix
-    
+        x_mask, o_mask = self.masks['X'], self.masks['O']
+        cols = self.geometry.cols
+        board = []
+        for row in range(self.geometry.rows):
+            cells = []
+            for col in range(cols):
+                bit = 1 << (row * cols + col)
+                cells.append('X' if x_mask & bit else 'O' if o_mask & bit else ' ')
+            board.append(cells)
+        return board
+
+    @property
+    def empty_mask(self) -> int:
+        return self.full_mask & ~(self.masks['X'] | self.masks['O'])
+        
     def copy(self):
-        new_game = TicTacToeGame(self.grid_size, self.simulation)
-        new_game.board = [row[:] for row in self.board]
-        new_game.current_player = self.current_player
+        '''
+        Return an independent game state; the geometry and the view are shared, not rebuilt.
+        '''
+        new_game = object.__new__(TicTacToeGame)
+        new_game.__dict__.update(self.__dict__)
+        new_game.masks = self.masks.copy()
+        new_game.line_counts = {'X': self.line_counts['X'][:], 'O': self.line_counts['O'][:]}
+        new_game.threats = {'X': self.threats['X'].copy(), 'O': self.threats['O'].copy()}
+        new_game.history = self.history[:]
         return new_game
 
+    def canonical(self) -> Tuple[Tuple[int, int], int]:
+        '''
+        Return (key, symmetry): the board's canonical (x_mask, o_mask) under rotation and reflection, the same 
+        for all symmetric boards, and the index of the symmetry that maps this board onto it (see to_canonical_move).
+        '''
+        return self.geometry.canonical(self.masks['X'], self.masks['O'])
+
+    def to_canonical_move(self, cell, symmetry) -> int:
+        return self.geometry.symmetries[symmetry][int(cell) - 1] + 1
+
+    def from_canonical_move(self, cell, symmetry) -> int:
+        return self.geometry.inverse_symmetries[symmetry][int(cell) - 1] + 1
+
+    def distinct_moves_mask(self) -> int:
+        '''
+        Return the empty cells as a bitmask, keeping only the lowest cell of each set of moves that lead to 
+        symmetric positions (the same as empty_mask when the board has no symmetry).
+        '''
+        x_mask, o_mask = self.masks['X'], self.masks['O']
+        transform_mask = self.geometry.transform_mask
+        stabilizer = [symmetry for symmetry in self.geometry.symmetries[1:] 
+                      if transform_mask(x_mask, symmetry) == x_mask and transform_mask(o_mask, symmetry) == o_mask]
+        empty = self.empty_mask
+        if not stabilizer:
+            return empty
+        distinct = covered = 0
+        while empty:
+            low_bit = empty & -empty
+            empty ^= low_bit
+            if not covered & low_bit:
+                distinct |= low_bit
+                cell = low_bit.bit_length() - 1
+                for symmetry in stabilizer:
+                    covered |= 1 << symmetry[cell]
+        return distinct
+
     def get_cell_coords_by_label(self, cell_label):
-        x = (int(cell_label) - 1) // self.grid_size
-        y = (int(cell_label) - 1) % self.grid_size
-        return x, y
+        return self.geometry.label_coords[int(cell_label) - 1]
 
     def get_valid_moves(self) -> List[int]:
-        moves = [row * self.grid_size + col + 
-                 1 for row in range(self.grid_size) for col in range(self.grid_size) if self.board[row][col] == ' ']
+        empty = self.empty_mask
+        moves = []
+        while empty:
+            low_bit = empty & -empty
+            moves.append(low_bit.bit_length())
+            empty ^= low_bit
         return moves
  
     def is_blocking_move(self, cell, player) -> bool:
-        x, y = self.get_cell_coords_by_label(cell)
         opponent = 'X' if player == 'O' else 'O'
-        lines = [[(x, col) for col in range(self.grid_size)],[(row, y) for row in range(self.grid_size)],]
-        if x == y:
-            lines.append([(i, i) for i in range(self.grid_size)])
-        if x + y == self.grid_size - 1:
-            lines.append([(i, self.grid_size - 1 - i) for i in range(self.grid_size)])
-        for line in lines:
-            if self._count_claimed_cells_in_line(opponent, line) == self.grid_size - 1 and self.board[x][y] == ' ':
-                return True
-        return False
+        return self.is_winning_move(cell, opponent)
  
     def is_draw(self) -> bool:
-        return not (self.is_winner('X') or self.is_winner('O')) and all([cell != ' ' for row in self.board for cell in row])
+        return self.outcome == 'Draw'
 
     def is_winner(self, player) -> bool:
-        lines = [[(row, col) for col in range(self.grid_size)] for row in range(self.grid_size)] + [[(row, col) for row in range(self.grid_size)] for col in range(self.grid_size)] + [[(i, i) for i in range(self.grid_size)], [(i, self.grid_size - 1 - i) for i in range(self.grid_size)],]
-        for line in lines:
-            if self._count_claimed_cells_in_line(player, line) == self.grid_size:
-                return True
-        return False
+        return self.outcome == player
     
     def is_winning_move(self, cell, player) -> bool:
-        x, y = self.get_cell_coords_by_label(cell)
-        lines = [[(x, col) for col in range(self.grid_size)],[(row, y) for row in range(self.grid_size)],]
-        if x == y:
-            lines.append([(i, i) for i in range(self.grid_size)])
-        if x + y == self.grid_size - 1:
-            lines.append([(i, self.grid_size - 1 - i) for i in range(self.grid_size)])
-        for line in lines:
-            if self._count_claimed_cells_in_line(player, line) == self.grid_size - 1 and self.board[x][y] == ' ':
-                return True
-        return False
+        return int(cell) in self.threats[player]
+
+    def winning_moves(self, player):
+        '''
+        The cells (labels) that would complete a line for player: a view of its maintained threat set.
+        '''
+        return self.threats[player].keys()
     
     def message(self, msg) -> None:
         self.view.message(msg)
@@ -194,60 +388,168 @@ class TicTacToeGame:
         '''
         if cell is None:
             return False
-        x, y = self.get_cell_coords_by_label(cell)
-        if self.board[x][y] == ' ':
-            self.board[x][y] = player
+        idx = int(cell) - 1
+        bit = 1 << idx
+        if self.empty_mask & bit:
+            self.history.append((idx + 1, player, self.current_player, self.outcome))
+            self.masks[player] |= bit
+            self.move_count += 1
+            opponent = 'X' if player == 'O' else 'O'
+            counts, other_counts = self.line_counts[player], self.line_counts[opponent]
+            threats, other_threats = self.threats[player], self.threats[opponent]
+            empty = None
+            needed = self.k - 1
+            for line in self.cell_lines[idx]:
+                mine, theirs = counts[line], other_counts[line]
+                if not mine and theirs == needed: # the opponent's threat on cell is blocked
+                    _discard(other_threats, idx + 1)
+                if not theirs and mine == needed: # player's threat on cell is taken: the line is complete
+                    _discard(threats, idx + 1)
+                mine += 1
+                counts[line] = mine
+                if not theirs and mine == needed: # a new threat, on the line's one empty cell
+                    if empty is None:
+                        empty = self.empty_mask
+                    cell_label = (self.win_masks[line] & empty).bit_length()
+                    threats[cell_label] = threats.get(cell_label, 0) + 1
+                if mine == self.k and self.outcome is None:
+                    self.outcome = player
+            if self.outcome is None and self.move_count == self.geometry.cells:
+                self.outcome = 'Draw'
             self.current_player = 'X' if player == 'O' else 'O'
             return True
         return False
     
-    def play_game(self, p1, p2, viewer) -> str:
+    def play_game(self, p1, p2, viewer, latency=None) -> str:
         '''
         The Tic-Tac-Toe game loop: calls p1 and p2 for plays until a match concludes; returns outcome (X, O, Draw).
+        A simulation whose viewer wants no messages takes the headless path (see _play_headless).
+        Given a latency.LatencyRecorder, each player's decision time is recorded by ply.
         '''
+        if self.simulation and not viewer.wants_messages:
+            return self._play_headless(p1, p2, latency)
         if self.AI_ONLY_MODE:
             pause = TURN_PAUSE 
         else:
             pause = 0                     
         turn = 0
-        while turn < self.grid_size ** 2:
+        while turn < self.geometry.cells:
             if self.current_player == 'X': 
-                if not turn == 0:
+                if not turn == 0 and pause:
                     sleep(pause)
-                move = p1(self)
-                player_id = p1.name
+                player = p1
             else:
-                sleep(pause) 
-                move = p2(self)
-                player_id = p2.name
+                if pause:
+                    sleep(pause) 
+                player = p2
+            if latency is None:
+                move = player(self)
+            else:
+                time_begin = perf_counter_ns()
+                move = player(self)
+                latency.record(player_key(player), self.move_count + 1, perf_counter_ns() - time_begin)
+            player_id = player.name
             viewer.message(f"turn {turn + 1}: Player {self.current_player} ({player_id}) played {move}")
             valid_move = self.move(move, self.current_player)
             if valid_move:
                 turn += 1
                 viewer()
-                if self.is_winner('X'):
+                if self.outcome == 'X':
                     viewer.message(f'{self.current_player} ({p1.name}) wins!')
-                    conclusion = 'X'
-                elif self.is_winner('O'):
+                elif self.outcome == 'O':
                     viewer.message(f'{self.current_player} ({p2.name}) wins!')
-                    conclusion = 'O'
-                elif self.is_draw():
+                elif self.outcome == 'Draw':
                     viewer.message('Draw!')
-                    conclusion = 'Draw'
-            if self.is_winner('X') or self.is_winner('O') or self.is_draw():
+            if self.outcome is not None:
                 break          
+        conclusion = self.outcome
         if not self.simulation:
             continue_playing = viewer.ask_to_continue()
             if not continue_playing:
                 self.quit_game()
-        self.board = self._generate_board()
-        self.current_player = 'X'    
+        self.reset()
+        return conclusion
+
+    def _play_headless(self, p1, p2, latency=None) -> str:
+        '''
+        The game loop with nothing but the plays: no messages, no view updates and no pauses.
+        '''
+        players = {'X': p1, 'O': p2}
+        if latency is None:
+            while self.outcome is None:
+                player = self.current_player
+                self.move(players[player](self), player)
+        else:
+            keys = {'X': player_key(p1), 'O': player_key(p2)}
+            while self.outcome is None:
+                player = self.current_player
+                time_begin = perf_counter_ns()
+                move = players[player](self)
+                latency.record(keys[player], self.move_count + 1, perf_counter_ns() - time_begin)
+                self.move(move, player)
+        conclusion = self.outcome
+        self.reset()
         return conclusion
 
+    def reset(self) -> None:
+        '''
+        Clear the board and counters for a new game, X to play.
+        '''
+        self.masks = {'X': 0, 'O': 0}
+        self.line_counts = {'X': [0] * len(self.win_masks), 'O': [0] * len(self.win_masks)}
+        self.threats = {'X': {}, 'O': {}}
+        self.move_count = 0
+        self.outcome = None
+        self.history = []
+        self.current_player = 'X' #  First player is X
+
+    def undo(self):
+        '''
+        Take back the last move (restoring the current player and outcome); return its cell, or None if there are no moves.
+        '''
+        if not self.history:
+            return None
+        cell, player, previous_player, previous_outcome = self.history.pop()
+        idx = cell - 1
+        self.masks[player] ^= 1 << idx
+        self.move_count -= 1
+        # the reverse of move(): drop the threat the move made on each line, then restore the ones it removed
+        opponent = 'X' if player == 'O' else 'O'
+        counts, other_counts = self.line_counts[player], self.line_counts[opponent]
+        threats, other_threats = self.threats[player], self.threats[opponent]
+        empty = None
+        needed = self.k - 1
+        for line in self.cell_lines[idx]:
+            mine, theirs = counts[line], other_counts[line]
+            if not theirs and mine == needed:
+                if empty is None:
+                    empty = self.empty_mask & ~(1 << idx)
+                _discard(threats, (self.win_masks[line] & empty).bit_length())
+            mine -= 1
+            counts[line] = mine
+            if not mine and theirs == needed:
+                other_threats[cell] = other_threats.get(cell, 0) + 1
+            if not theirs and mine == needed:
+                threats[cell] = threats.get(cell, 0) + 1
+        self.current_player = previous_player
+        self.outcome = previous_outcome
+        return cell
+
     def quit_game(self) -> None:
         print("Quitting the game...")
         exit()
 
+
+def _discard(threats, cell) -> None:
+    '''
+    Count one line fewer through cell in a threat set (cell -> lines), dropping the cell at zero.
+    '''
+    lines = threats[cell] - 1
+    if lines:
+        threats[cell] = lines
+    else:
+        del threats[cell]
+
                     
 if __name__ == '__main__':
     #  Mostly as an excersize in making robust Python code, the grid can be any size, 
@@ -260,7 +562,7 @@ if __name__ == '__main__':
     this_viewer = Console_Viewer(game)
     
     AI_ONLY_MODE = False
-    TURN_PAUSE = 0.4 #  DEBUG?: to allow for slowed-play (i.e. execute main.py and run AI vs AI games)
+    MCTS_TIME_BUDGET = 0.05 #  seconds per AI_MCTS move (at most its 500 iterations), to keep interactive play responsive
     
     #  Menu & Game loop:
     while True:
@@ -271,6 +573,7 @@ if __name__ == '__main__':
                             '\n\t2. Human as X vs. AI_MCTS as O' +
                             '\n\t3. Human as X vs. AI_Jack as O' + 
                             '\n\t4. AI_Jack as X vs. Human as O' +
+                            '\n\t9. Human as X vs. AI_Negamax as O' +
                             
                             '\n\tAI vs. AI modes:' +
                             '\n\t5. AI_Rando as X vs. AI_Jack as O' +
@@ -284,23 +587,25 @@ if __name__ == '__main__':
         if bool(mode.strip() == '1'):       #  play Human vs AI_Rando
             game.play_game(Human('Human', 'X', this_viewer, game), AI_Rando('AI_Rando', 'O', this_viewer, game), this_viewer) 
         elif bool(mode.strip() == '2'):     #  play Human vs AI_MCTS
-            game.play_game(Human('Human', 'X', this_viewer, game), AI_MCTS('AI_MCTS', 'O', this_viewer, game), this_viewer)
+            game.play_game(Human('Human', 'X', this_viewer, game), AI_MCTS('AI_MCTS', 'O', this_viewer, game, time_budget=MCTS_TIME_BUDGET), this_viewer)
         elif bool(mode.strip() == '3'):     #  play Human vs AI_Jack
             game.play_game(Human('Human', 'X', this_viewer, game), AI_Jack('AI_Jack', 'O', this_viewer, game), this_viewer)       
         elif bool(mode.strip() == '4'):     #  play AI_Jack vs Human
             game.play_game(AI_Jack('AI_Jack', 'X', this_viewer, game), Human('Human', 'O', this_viewer, game), this_viewer) 
+        elif bool(mode.strip() == '9'):     #  play Human vs AI_Negamax
+            game.play_game(Human('Human', 'X', this_viewer, game), AI_Negamax('AI_Negamax', 'O', this_viewer, game), this_viewer)
         elif bool(mode.strip() == '5'):     #  play AI_Rando vs AI_Jack
             AI_ONLY_MODE = True
             game.play_game(AI_Rando('AI_Rando', 'X', this_viewer, game), AI_Jack('AI_Jack', 'O', this_viewer, game), this_viewer)       
         elif bool(mode.strip() == '6'):     #  play AI_MCTS vs AI_Jack
             AI_ONLY_MODE = True
-            game.play_game(AI_MCTS('AI_MCTS', 'X', this_viewer, game), AI_Jack('AI_Jack', 'O', this_viewer, game), this_viewer)    
+            game.play_game(AI_MCTS('AI_MCTS', 'X', this_viewer, game, time_budget=MCTS_TIME_BUDGET), AI_Jack('AI_Jack', 'O', this_viewer, game), this_viewer)    
         elif bool(mode.strip() == '7'):     #  play AI_Jack vs AI_Rando
             AI_ONLY_MODE = True
             game.play_game(AI_Jack('AI_Jack', 'X', this_viewer, game), AI_Rando('AI_Rando', 'O', this_viewer, game), this_viewer)   
         elif bool(mode.strip() == '8'):     #  play AI_Jack vs AI_MCTS 
             AI_ONLY_MODE = True
-            game.play_game(AI_Jack('AI_Jack', 'X', this_viewer, game), AI_MCTS('AI_MCTS', 'O', this_viewer, game), this_viewer)       
+            game.play_game(AI_Jack('AI_Jack', 'X', this_viewer, game), AI_MCTS('AI_MCTS', 'O', this_viewer, game, time_budget=MCTS_TIME_BUDGET), this_viewer)       
         elif bool(mode.strip().lower() == 'q'):
             game.quit_game()
         else:
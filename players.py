@@ -1,6 +1,13 @@
-# players.py - BasePlayer, Human, AI_Jack, AI_MCTS, AI_Rando...TBD: AI_ML_SVM, AI_ML_NN, or AI_ML_RL
+# players.py - BasePlayer, Human, AI_Jack, AI_MCTS, AI_MCTS_Parallel, AI_ML_RL, AI_Negamax, AI_Rando, AI_Table...TBD: AI_ML_SVM, or AI_ML_NN
 import math
+import os
 import random
+import tablebase
+from array import array
+from importlib.util import find_spec
+from time import perf_counter
+
+QTABLE_MAX_CELLS = 12 # AI_ML_RL's Q-table has 3**cells rows of cells values: 25 MB at 12 cells, 170 GB at 16
 
 
 class BasePlayer:
@@ -15,6 +22,13 @@ class BasePlayer:
     
     def __call__(self, game) -> int:
         raise NotImplementedError('Subclasses must implement this method')
+
+    @classmethod
+    def supports(cls, geometry) -> bool:
+        '''
+        True if the player can play on geometry's board (all boards, unless a subclass says otherwise).
+        '''
+        return True
     
     def __str__(self) -> str:
         return f'{self.player_symbol}'
@@ -39,28 +53,35 @@ class Human(BasePlayer):
 
 
 class AI_Jack(BasePlayer):
+    '''
+    AI_Jack: 1. the winning move (the lowest, if there are several); 2. else a blocking move, chosen at random 
+    from those with the highest score_matrix value; 3. else a random move from the empty cells with the highest 
+    score_matrix value. Winning and blocking moves come from the game's threat sets, and the best-scoring empty 
+    cells from the geometry's score_groups, so a decision does not test every empty cell.
+    '''
     def __call__(self, game) -> int:  
-        moves = game.get_valid_moves()
-        if len(moves) == 0:
+        empty = game.empty_mask
+        if not empty:
             game.message('AI_Jack: No valid moves!')
             return None
-        if len(moves) == 1:
-            game.message('AI_Jack: Last move, ' + str(moves[0]) + '!')
-            return moves[0]
+        if not empty & (empty - 1):
+            move = empty.bit_length()
+            if game.wants_messages:
+                game.message('AI_Jack: Last move, ' + str(move) + '!')
+            return move
         # 1. AI_Jack: if there is a winning move, play it
-        for move in moves:
-            if game.is_winning_move(move, self.player_symbol):
+        winning_moves = game.winning_moves(self.player_symbol)
+        if winning_moves:
+            move = min(winning_moves)
+            if game.wants_messages:
                 game.message('AI_Jack: Winning move, ' + str(move) + '!')
-                return move
+            return move
         # 2. AI_Jack: if there are blocking moves, play one from the set with the highest score_matrix
-        blocking_moves = []
-        for move in moves:
-            if game.is_blocking_move(move, self.player_symbol):
-                blocking_moves.append(move)
-        if len(blocking_moves) > 0:
+        blocking_moves = game.winning_moves('X' if self.player_symbol == 'O' else 'O')
+        if blocking_moves:
             max_score = 0
             best_moves = []
-            for move in blocking_moves:
+            for move in sorted(blocking_moves):
                 x, y = game.get_cell_coords_by_label(move)
                 score = game.score_matrix[x][y]
                 if score > max_score:
@@ -68,138 +89,755 @@ class AI_Jack(BasePlayer):
                     best_moves = [move]
                 elif score == max_score:
                     best_moves.append(move)
-            game.message('AI_Jack: Blocking move, ' + str(move) + '!')
-            return random.choice(best_moves)    
+            move = random.choice(best_moves)
+            if game.wants_messages:
+                game.message('AI_Jack: Blocking move, ' + str(move) + '!')
+            return move
         # 3. AI_Jack: if there are no blocking moves, play a random move from the set with the highest score_matrix
-        max_score = 0
+        for group in game.geometry.score_groups:
+            candidates = empty & group
+            if candidates:
+                break
         best_moves = []
-        for move in moves:
-            x, y = game.get_cell_coords_by_label(move)
-            score = game.score_matrix[x][y]
-            if score > max_score:
-                max_score = score
-                best_moves = [move]
-            elif score == max_score:
-                best_moves.append(move)
+        while candidates:
+            low_bit = candidates & -candidates
+            best_moves.append(low_bit.bit_length())
+            candidates ^= low_bit
         move = random.choice(best_moves)
-        game.message('AI_Jack: I\'ll try this, ' + str(move) + '!')
+        if game.wants_messages:
+            game.message('AI_Jack: I\'ll try this, ' + str(move) + '!')
         return move
 
 
 class AI_MCTS(BasePlayer):
-    def __init__(self, player_ID, player_symbol, viewer, game, exploration_param=1.4, max_iterations=500):
+    '''
+    AI_MCTS: Monte Carlo Tree Search over an array-backed MCTSTree. The search runs on a single 
+    private copy of the game, playing each iteration's line forward with move() and rolling it 
+    back with undo(); rollouts play out on plain bitmasks.
+
+    The tree is kept between moves: on each call the subtree reached by the moves played since 
+    the last search (its own move and the opponent's reply) becomes the new root, and the rest 
+    is discarded. search_stats records, per move, how many visits were inherited that way.
+
+    Each search runs until max_iterations have been performed or time_budget seconds have passed, 
+    whichever comes first (either may be None for no limit, but not both); search_stats also records 
+    the iterations performed, the time taken and the iterations/second for each move.
+
+    With rollout_batch > 0, each leaf is evaluated by that many rollouts played simultaneously 
+    as NumPy arrays (see vectorized.BatchRollout) and the mean result is backpropagated.
+
+    With merge_symmetric, moves leading to symmetric positions share one child (the lowest such 
+    cell), so their statistics are merged; this mostly prunes the opening.
+
+    The tree is also an MCTS-Solver: positions whose result is certain are proven (see MCTSTree) 
+    and are neither selected nor rolled out again, and the search stops early once the root is 
+    proven. A proven win is always played, and a proven loss only if every move loses.
+
+    With rave_equivalence > 0, selection uses RAVE: each child also keeps all-moves-as-first 
+    statistics, updated by every simulation through its parent in which its move was played 
+    at any later point by the same player, and a child's value blends its own mean with its 
+    AMAF mean, weighted sqrt(k / (3 * visits + k)) for k = rave_equivalence; the AMAF estimate 
+    dominates while a child has few visits and fades as they grow past k.
+    '''
+    def __init__(self, player_ID, player_symbol, viewer, game, exploration_param=1.4, max_iterations=500, time_budget=None, rollout_batch=0, merge_symmetric=False, rave_equivalence=0):
         super().__init__(player_ID, player_symbol, viewer, game)
+        assert max_iterations is not None or time_budget is not None, 'AI_MCTS needs an iteration cap or a time budget'
+        assert not (rollout_batch and rave_equivalence), 'RAVE needs the moves of each rollout, which batched rollouts do not keep'
         self.exploration_param = exploration_param
         self.max_iterations = max_iterations
+        self.time_budget = time_budget
+        self.rollout_batch = rollout_batch
+        self.batch_rollout = None
+        self.merge_symmetric = merge_symmetric
+        self.rave_equivalence = rave_equivalence
+        self.tree_capacity = (max_iterations if max_iterations is not None else 1023) + 1
+        self.root = None
+        self.root_history = ()
+        self.search_stats = []
 
     def __call__(self, game):
-        self.root = Node(game)
-        for _ in range(self.max_iterations):
-            selected_node = self.tree_policy(self.root)
-            result = selected_node.rollout()
-            selected_node.backpropagate(result)
-        best_child_node = self.root.best_child(0)  # exploitation only
-        if best_child_node is not None:
-            game.message(f'AI_MCTS: I\'ve calculated my move, taking {best_child_node.move}!')
-            return best_child_node.move
+        if game.outcome is not None:
+            game.message('AI_MCTS: No valid moves!')
+            return None
+        state = game.copy()
+        self.root = self.reuse_tree(state)
+        inherited_visits = self.root.visits[0]
+        iterations, elapsed = self.search(self.root, state)
+        rate = iterations / elapsed if elapsed > 0 else 0.0
+        self.search_stats.append({'inherited_visits': inherited_visits, 'iterations': iterations, 
+                                  'seconds': round(elapsed, 6), 'iterations_per_second': round(rate, 1)})
+        best_child_node = self.root.chosen_child(0)
+        if best_child_node != -1:
+            move = self.root.move[best_child_node]
+            if game.wants_messages:
+                game.message(f'AI_MCTS: I\'ve calculated my move, taking {move}! ({iterations} iterations at {rate:.0f}/s, {inherited_visits} visits reused)')
+            return move
         else:
             game.message('AI_MCTS: No valid moves!')
             return None
 
-    def tree_policy(self, node):
-        while not node.game_state.is_winner("X") and not node.game_state.is_winner("O") and not node.game_state.is_draw():
-            if not node.fully_expanded():
-                return node.expand()
+    def search(self, tree, state):
+        '''
+        Run MCTS iterations on tree (whose root is state) within the iteration cap and time budget; return (iterations, seconds).
+        '''
+        depth = len(state.history)
+        open_cells = state.empty_mask # the cells whose AMAF statistics can matter in this search
+        rollout = self.rollout if not self.rollout_batch else self.get_batch_rollout(state)
+        max_iterations = self.max_iterations if self.max_iterations is not None else float('inf')
+        time_begin = perf_counter()
+        deadline = time_begin + self.time_budget if self.time_budget is not None else float('inf')
+        iterations = 0
+        while iterations < max_iterations and perf_counter() < deadline and not tree.solved():
+            selected_node = self.tree_policy(tree, state)
+            result = tree.proven[selected_node]
+            if self.rave_equivalence:
+                mover = 'X' if state.current_player == 'O' else 'O'
+                if result < 0:
+                    outcome, x_mask, o_mask = self.play_out(state)
+                    result = 1.0 if outcome == mover else 0.5 if outcome == 'Draw' else 0.0
+                else:
+                    tree.solve(selected_node)
+                    x_mask, o_mask = state.masks['X'], state.masks['O']
+                if mover == 'X':
+                    tree.backpropagate_amaf(selected_node, result, x_mask & open_cells, o_mask & open_cells)
+                else:
+                    tree.backpropagate_amaf(selected_node, result, o_mask & open_cells, x_mask & open_cells)
             else:
-                node = node.best_child(self.exploration_param)
-        return node
+                if result < 0:
+                    result = 1 - rollout(state) # the rollout scores for the player to move, the node for the player who moved
+                else:
+                    tree.solve(selected_node)
+                tree.backpropagate(selected_node, result)
+            while len(state.history) > depth:
+                state.undo()
+            iterations += 1
+        return iterations, perf_counter() - time_begin
+
+    def get_batch_rollout(self, state):
+        if self.batch_rollout is None or self.batch_rollout.geometry is not state.geometry:
+            import vectorized # NumPy is only needed for batched rollouts
+            self.batch_rollout = vectorized.BatchRollout(state.geometry, self.rollout_batch, seed=random.getrandbits(64))
+        return self.batch_rollout
+
+    def reuse_tree(self, state):
+        '''
+        Return the search tree for state: the subtree of the previous tree reached by the moves played 
+        since it was built, rerooted, or a new tree if the position is not in it (e.g. a new game).
+        '''
+        history = tuple(entry[0] for entry in state.history)
+        previous_history, self.root_history = self.root_history, history
+        known = len(previous_history)
+        if self.root is not None and history[:known] == previous_history:
+            node = 0
+            for move in history[known:]:
+                node = next((child for child in self.root.children(node) if self.root.move[child] == move), -1)
+                if node == -1:
+                    break
+            if node != -1:
+                self.root.reroot(node, self.root.subtree_size(node) + self.tree_capacity)
+                return self.root
+        return self.new_tree(state)
+
+    def new_tree(self, state):
+        return MCTSTree(state, capacity=self.tree_capacity, merge_symmetric=self.merge_symmetric, rave=bool(self.rave_equivalence))
+
+    def tree_policy(self, tree, state, node=0):
+        '''
+        Descend from node through unproven children, applying each move to state; return the new leaf expanded there,
+        or the node where the descent stops if it has neither untried moves nor unproven children (e.g. a finished game).
+        '''
+        while not tree.untried[node]:
+            child = tree.best_child(node, self.exploration_param, self.rave_equivalence)
+            if child == -1:
+                return node
+            node = child
+            state.move(tree.move[node], state.current_player)
+        return tree.expand(node, state)
+
+    @staticmethod
+    def rollout(state):
+        '''
+        Play out state with the rollout policy (a random move among the empty cells with the highest
+        score_matrix value); return the result for the player to move: 1 win, 0.5 draw, 0 loss.
+        state itself is not modified.
+        '''
+        player = state.current_player
+        outcome = AI_MCTS.play_out(state)[0]
+        if outcome == player:
+            return 1
+        elif outcome == 'Draw':
+            return 0.5
+        else:
+            return 0
+
+    @staticmethod
+    def play_out(state):
+        '''
+        Play out state with the rollout policy (see rollout); return (outcome, X's final mask, O's final mask).
+        '''
+        outcome = state.outcome
+        masks = [state.masks['X'], state.masks['O']]
+        if outcome is None:
+            score_groups = state.geometry.score_groups
+            cell_win_masks = state.geometry.cell_win_masks
+            turn = 0 if state.current_player == 'X' else 1
+            empty = state.empty_mask
+            while outcome is None:
+                for group in score_groups:
+                    candidates = empty & group
+                    if candidates:
+                        break
+                cell = _random_cell(candidates) - 1
+                bit = 1 << cell
+                mask = masks[turn] | bit
+                masks[turn] = mask
+                empty ^= bit
+                for line in cell_win_masks[cell]:
+                    if mask & line == line:
+                        outcome = 'XO'[turn]
+                        break
+                else:
+                    if not empty:
+                        outcome = 'Draw'
+                turn ^= 1
+        return outcome, masks[0], masks[1]
 
     
+class AI_MCTS_Parallel(AI_MCTS):
+    '''
+    AI_MCTS_Parallel: root-parallel MCTS. Each move, `workers` independent searches (differently seeded, 
+    each with the full iteration cap and time budget) are run from the same root in a process pool, and 
+    their root children's wins/visits are summed before choosing the move. The pool is shared by all 
+    players with the same number of workers and stays alive across moves and games.
+
+    Any other keyword arguments are AI_MCTS search options, passed on to the workers' searches.
+    '''
+    def __init__(self, player_ID, player_symbol, viewer, game, workers=None, **search_options):
+        super().__init__(player_ID, player_symbol, viewer, game, **search_options)
+        self.workers = workers or os.cpu_count() or 1
+        self.search_options = search_options
+
+    def __call__(self, game):
+        if game.outcome is not None:
+            game.message('AI_MCTS_Parallel: No valid moves!')
+            return None
+        state = game.copy()
+        state.view = None # not needed by the workers, and not worth pickling
+        time_begin = perf_counter()
+        pool = _get_process_pool(self.workers)
+        searches = [pool.submit(_root_search, state, random.getrandbits(32), self.search_options) for _ in range(self.workers)]
+        root_stats = {}
+        iterations = 0
+        for search in searches:
+            children, worker_iterations = search.result()
+            iterations += worker_iterations
+            for move, (wins, visits, proven) in children.items():
+                total_wins, total_visits, known = root_stats.get(move, (0.0, 0, -1.0))
+                root_stats[move] = (total_wins + wins, total_visits + visits, max(known, proven))
+        elapsed = perf_counter() - time_begin
+        rate = iterations / elapsed if elapsed > 0 else 0.0
+        self.search_stats.append({'inherited_visits': 0, 'iterations': iterations, 
+                                  'seconds': round(elapsed, 6), 'iterations_per_second': round(rate, 1)})
+        if root_stats:
+            move = max(root_stats, key=lambda move: _move_value(*root_stats[move]))  # exploitation only
+            if game.wants_messages:
+                game.message(f'AI_MCTS_Parallel: I\'ve calculated my move, taking {move}! ({iterations} iterations on {self.workers} workers at {rate:.0f}/s)')
+            return move
+        else:
+            game.message('AI_MCTS_Parallel: No valid moves!')
+            return None
+
+
+_PROCESS_POOLS = {}
+
+
+def _get_process_pool(workers):
+    if workers not in _PROCESS_POOLS:
+        from concurrent.futures import ProcessPoolExecutor # multiprocessing is slow to import, and only AI_MCTS_Parallel needs it
+        _PROCESS_POOLS[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _PROCESS_POOLS[workers]
+
+
+def _root_search(state, seed, search_options):
+    '''
+    Worker for AI_MCTS_Parallel: search state from scratch; return ({move: (wins, visits, proven)} for the root's children, iterations).
+    '''
+    random.seed(seed)
+    searcher = AI_MCTS('worker', state.current_player, None, state, **search_options)
+    tree = searcher.new_tree(state)
+    iterations, _ = searcher.search(tree, state)
+    return {tree.move[child]: (tree.wins[child], tree.visits[child], tree.proven[child]) for child in tree.children(0)}, iterations
+
+
+def _move_value(wins, visits, proven):
+    '''
+    The value of a move for the player making it: its proven value (when proven), else its mean rollout result.
+    '''
+    return proven if proven >= 0 else wins / visits
+
+
+class AI_Negamax(BasePlayer):
+    '''
+    AI_Negamax: alpha-beta negamax search with iterative deepening and a transposition table. Moves 
+    are ordered by the table's best move, then by score_matrix. The search deepens until the game is 
+    solved, max_depth is reached or time_budget seconds have passed (positions beyond the depth limit 
+    are scored by open lines); with no limit binding it plays perfectly.
+
+    The transposition tables (one per board, keyed by the players' bitmasks) are shared by every 
+    AI_Negamax in the process, so they carry over between moves and games.
+    '''
+    WIN = 1_000_000
+    EXACT, LOWER, UPPER = 0, 1, 2
+    SOLVED = 1 << 30 # depth stored for entries searched to the end of the game
+    TABLE_LIMIT = 2_000_000 # entries per table, beyond which the table is cleared
+    transposition_tables = {}
+
+    def __init__(self, player_ID, player_symbol, viewer, game, max_depth=None, time_budget=1.0):
+        super().__init__(player_ID, player_symbol, viewer, game)
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.deadline = float('inf')
+        self.nodes = 0
+
+    def __call__(self, game):
+        if game.outcome is not None or not game.empty_mask:
+            game.message('AI_Negamax: No valid moves!')
+            return None
+        state = game.copy()
+        table = self.transposition_tables.setdefault(state.geometry.key, {})
+        if len(table) > self.TABLE_LIMIT:
+            table.clear()
+        self.deadline = perf_counter() + self.time_budget if self.time_budget is not None else float('inf')
+        self.nodes = 0
+        empties = state.geometry.cells - state.move_count
+        max_depth = min(self.max_depth or empties, empties)
+        key = (state.masks['X'], state.masks['O'])
+        move, value, depth = state.geometry.move_order[0], 0, 0
+        for depth in range(1, max_depth + 1):
+            try:
+                value = self.negamax(state, table, depth, -float('inf'), float('inf'))
+            except _SearchTimeout:
+                depth -= 1
+                break
+            move = table[key][3]
+        if move is None or not game.empty_mask & (1 << (move - 1)):
+            move = next(cell for cell in state.geometry.move_order if game.empty_mask & (1 << (cell - 1)))
+        if game.wants_messages:
+            verdict = 'win' if value >= self.WIN else 'loss' if value <= -self.WIN else 'draw' if depth == empties else f'{value:+}'
+            game.message(f'AI_Negamax: taking {move} (depth {depth}, {verdict}, {self.nodes} nodes)')
+        return move
+
+    def negamax(self, state, table, depth, alpha, beta):
+        '''
+        Return the value of state for the player to move, searching depth plies (state is restored on return).
+        '''
+        self.nodes += 1
+        if not self.nodes & 1023 and perf_counter() > self.deadline:
+            raise _SearchTimeout()
+        if state.outcome is not None:
+            # the side to move has lost (or drawn); sooner wins are worth more
+            return 0 if state.outcome == 'Draw' else -(self.WIN + state.geometry.cells - state.move_count)
+        if depth == 0:
+            return self.evaluate(state)
+        key = (state.masks['X'], state.masks['O'])
+        entry = table.get(key)
+        table_move = None
+        if entry is not None:
+            entry_depth, entry_value, entry_flag, table_move = entry
+            if entry_depth >= depth:
+                if entry_flag == self.EXACT:
+                    return entry_value
+                elif entry_flag == self.LOWER:
+                    alpha = max(alpha, entry_value)
+                else:
+                    beta = min(beta, entry_value)
+                if alpha >= beta:
+                    return entry_value
+        original_alpha = alpha
+        best_value, best_move = -float('inf'), None
+        empty = state.empty_mask
+        moves = [cell for cell in state.geometry.move_order if empty & (1 << (cell - 1)) and cell != table_move]
+        if table_move is not None and empty & (1 << (table_move - 1)):
+            moves.insert(0, table_move)
+        for move in moves:
+            state.move(move, state.current_player)
+            try:
+                value = -self.negamax(state, table, depth - 1, -beta, -alpha)
+            finally: # also on _SearchTimeout, so that the caller's state is intact
+                state.undo()
+            if value > best_value:
+                best_value, best_move = value, move
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+        flag = self.UPPER if best_value <= original_alpha else self.LOWER if best_value >= beta else self.EXACT
+        table[key] = (depth if depth < state.geometry.cells - state.move_count else self.SOLVED, best_value, flag, best_move)
+        return best_value
+
+    @staticmethod
+    def evaluate(state):
+        '''
+        Heuristic value for the player to move: the squared piece counts of the lines only they occupy, less the opponent's.
+        '''
+        player = state.current_player
+        mine = state.line_counts[player]
+        theirs = state.line_counts['X' if player == 'O' else 'O']
+        value = 0
+        for own, other in zip(mine, theirs):
+            if not other:
+                value += own * own
+            elif not own:
+                value -= other * other
+        return value
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class AI_Table(BasePlayer):
+    '''
+    AI_Table: perfect 3x3 play with no thinking time; each move is a random choice among the best moves 
+    listed for the position in the memory-mapped tablebase (see tablebase.py), generated on first use.
+    '''
+    def __init__(self, player_ID, player_symbol, viewer, game, path=tablebase.DEFAULT_PATH):
+        super().__init__(player_ID, player_symbol, viewer, game)
+        if not self.supports(game.geometry):
+            raise ValueError('AI_Table: the tablebase only covers 3x3 tic-tac-toe (3 in a row)')
+        self.table = tablebase.load(path, game.geometry)
+        if game.geometry.key != (self.table.grid_size,) * 3:
+            raise ValueError(f'AI_Table: the tablebase is for a {self.table.grid_size}x{self.table.grid_size} board, {self.table.grid_size} in a row')
+
+    @classmethod
+    def supports(cls, geometry) -> bool:
+        return geometry.key == (3, 3, 3)
+
+    def __call__(self, game):
+        entry = self.table.lookup(game.masks['X'], game.masks['O'])
+        if entry is None or not entry[1]:
+            game.message('AI_Table: No valid moves!')
+            return None
+        move = random.choice(entry[1])
+        if game.wants_messages:
+            game.message(f'AI_Table: taking {move}!')
+        return move
+
+
+class AI_ML_RL(BasePlayer):
+    '''
+    AI_ML_RL: tabular Q-learning, trained by self-play (see qlearning.py); each move is a random choice among 
+    the moves with the highest learned value. The Q-table is a memory-mapped .npy file per board, trained 
+    (in a few seconds for 3x3) on first use; only boards of up to QTABLE_MAX_CELLS cells are supported.
+    '''
+    def __init__(self, player_ID, player_symbol, viewer, game, path=None):
+        super().__init__(player_ID, player_symbol, viewer, game)
+        import qlearning # NumPy is only needed by this player
+        self.table = qlearning.load(path, game.geometry)
+        if self.table.cells != game.geometry.cells:
+            raise ValueError(f'AI_ML_RL: the Q-table is for {self.table.cells} cells, not {game.geometry.cells}')
+
+    @classmethod
+    def supports(cls, geometry) -> bool:
+        return geometry.cells <= QTABLE_MAX_CELLS and find_spec('numpy') is not None # without importing NumPy
+
+    def __call__(self, game):
+        if not game.empty_mask:
+            game.message('AI_ML_RL: No valid moves!')
+            return None
+        move = random.choice(self.table.best_moves(game.masks['X'], game.masks['O']))
+        if game.wants_messages:
+            game.message(f'AI_ML_RL: I\'ve learned this one, taking {move}!')
+        return move
+
+
 class AI_Rando(BasePlayer):
     def __call__(self, game):
         move = random.choice(game.get_valid_moves())
-        comments = ['AI_Rando: Thinking... thinking... thinking... I\'ll claim cell ' + str(move) + '! ', 
-                    'AI_Rando: Thinking... thinking... I\'ll claim cell ' + str(move) + '! ',
-                    'AI_Rando: Thinking... I\'ll claim cell ' + str(move) + '! ',
-                    'AI_Rando: I\'ll claim cell ' + str(move) + '!', 
-                    'AI_Rando: I\'ve got it, taking cell ' + str(move) + '! ',]
-        game.message(random.choice(comments))
+        if game.wants_messages:
+            comments = ['AI_Rando: Thinking... thinking... thinking... I\'ll claim cell ' + str(move) + '! ', 
+                        'AI_Rando: Thinking... thinking... I\'ll claim cell ' + str(move) + '! ',
+                        'AI_Rando: Thinking... I\'ll claim cell ' + str(move) + '! ',
+                        'AI_Rando: I\'ll claim cell ' + str(move) + '!', 
+                        'AI_Rando: I\'ve got it, taking cell ' + str(move) + '! ',]
+            game.message(random.choice(comments))
         return move
     
     
-class Node:
-    def __init__(self, game_state, parent=None, move=None):
-        self.game_state = game_state
-        self.parent = parent
-        self.move = move
-        self.children = []
-        self.wins = 0
-        self.visits = 0
-
-    def add_child(self, child_node):
-        self.children.append(child_node)
-
-    def update(self, result):
-        self.visits += 1
-        self.wins += result
-
-    def fully_expanded(self):
-        return len(self.children) == len(self.game_state.get_valid_moves())
-
-    def untried_moves(self):
-        tried_moves = [child.move for child in self.children]
-        return [move for move in self.game_state.get_valid_moves() if move not in tried_moves]
-
-    def best_child(self, exploration_param):
+class MCTSTree:
+    '''
+    MCTSTree: an MCTS tree stored as a struct of arrays, one slot per node (node 0 is the root):
+
+                parent[i], move[i]      - the parent node, and the cell played to reach node i
+                wins[i], visits[i]      - the rollout statistics, scored for the player who played move[i]
+                amaf_wins[i * cells + c], amaf_visits[i * cells + c] - with rave, the all-moves-as-first statistics
+                                          of cell c + 1 at node i, for the player to move there (see backpropagate_amaf)
+                proven[i]               - the certain result of node i for that player (1 win, 0.5 draw, 0 loss),
+                                          or -1 while unproven
+                first_child[i], next_sibling[i] - the children of node i as a linked list (-1 terminated)
+                untried[i]              - bitmask of the moves not yet expanded from node i (with merge_symmetric,
+                                          only one of each set of moves leading to symmetric positions)
+
+    A node is proven when it is created if the game is over, if the player to move can win at once, or if
+    the player who moved threatens two wins at once; one threatened win leaves blocking it as the only
+    untried move. Proofs then propagate up (see solve): a child proven a win for the player to move proves
+    the node a loss, and once every move is expanded and proven, the node is worth the best of them.
+
+    Nodes hold no game state; the search replays moves on a single state (see AI_MCTS.tree_policy).
+    The buffers are preallocated and grow geometrically, so memory per search is predictable.
+    '''
+    __slots__ = ('size', 'capacity', 'parent', 'move', 'wins', 'visits', 'cells', 'amaf_wins', 'amaf_visits', 'proven', 'first_child', 'next_sibling', 'untried', 'merge_symmetric')
+
+    def __init__(self, game_state, capacity=1024, merge_symmetric=False, rave=False):
+        self.merge_symmetric = merge_symmetric
+        self.cells = game_state.geometry.cells if rave else 0
+        self.size = 0
+        self.capacity = max(1, capacity)
+        self.parent = array('i', [0]) * self.capacity
+        self.move = array('i', [0]) * self.capacity
+        self.wins = array('d', [0.0]) * self.capacity
+        self.visits = array('i', [0]) * self.capacity
+        self.amaf_wins = array('d', [0.0]) * (self.capacity * self.cells)
+        self.amaf_visits = array('i', [0]) * (self.capacity * self.cells)
+        self.proven = array('d', [0.0]) * self.capacity
+        self.first_child = array('i', [0]) * self.capacity
+        self.next_sibling = array('i', [0]) * self.capacity
+        self.untried = [0] * self.capacity
+        self.add_node(-1, 0, game_state)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        for buffer in (self.parent, self.move, self.wins, self.visits, self.amaf_wins, self.amaf_visits, self.proven, self.first_child, self.next_sibling, self.untried):
+            buffer.extend(buffer)
+        self.capacity *= 2
+
+    def add_node(self, parent, move, game_state):
+        '''
+        Append a node reached by playing move from parent (game_state is the position after the move); return its index.
+        '''
+        if self.size == self.capacity:
+            self._grow()
+        node = self.size
+        self.size += 1
+        self.parent[node] = parent
+        self.move[node] = move
+        self.wins[node] = 0.0
+        self.visits[node] = 0
+        if self.cells:
+            start = node * self.cells
+            self.amaf_wins[start:start + self.cells] = array('d', [0.0]) * self.cells
+            self.amaf_visits[start:start + self.cells] = array('i', [0]) * self.cells
+        self.first_child[node] = -1
+        self.proven[node] = -1.0
+        if game_state.outcome is not None:
+            self.proven[node] = 0.5 if game_state.outcome == 'Draw' else 1.0
+            self.untried[node] = 0
+        else:
+            player = game_state.current_player
+            winning = game_state.threats[player]
+            threatened = game_state.threats['X' if player == 'O' else 'O']
+            if winning: # the player to move wins next; keep one winning move, to play if this becomes the root
+                self.proven[node] = 0.0
+                self.untried[node] = 1 << (min(winning) - 1)
+            elif threatened:
+                if len(threatened) > 1: # two wins threatened, only one can be blocked
+                    self.proven[node] = 1.0
+                blocking = sum(1 << (cell - 1) for cell in threatened)
+                moves = game_state.distinct_moves_mask() if self.merge_symmetric else game_state.empty_mask
+                self.untried[node] = blocking & moves or blocking
+            elif self.merge_symmetric:
+                self.untried[node] = game_state.distinct_moves_mask()
+            else:
+                self.untried[node] = game_state.empty_mask
+        if parent != -1:
+            self.next_sibling[node] = self.first_child[parent]
+            self.first_child[parent] = node
+        else:
+            self.next_sibling[node] = -1
+        return node
+
+    def best_child(self, node, exploration_param, rave_equivalence=0):
+        '''
+        Return the unproven child of node with the highest UCT score (-1 if there is none), its mean blended
+        with its AMAF mean if rave_equivalence > 0 (see AI_MCTS).
+        '''
+        wins, visits, proven, next_sibling = self.wins, self.visits, self.proven, self.next_sibling
+        amaf_wins, amaf_visits, move = self.amaf_wins, self.amaf_visits, self.move
+        amaf_start = node * self.cells - 1 # amaf_start + label indexes node's statistics of the cell
+        log_visits = math.log(visits[node]) if visits[node] else 0.0
         best_score = float('-inf')
-        best_child = None
-        for child in self.children:
-            exploit = child.wins / child.visits
-            explore = math.sqrt(math.log(self.visits) / child.visits)
-            score = exploit + exploration_param * explore
-            if score > best_score:
-                best_score = score
-                best_child = child
+        best_child = -1
+        child = self.first_child[node]
+        while child != -1:
+            if proven[child] < 0:
+                child_visits = visits[child]
+                score = wins[child] / child_visits
+                if rave_equivalence:
+                    index = amaf_start + move[child]
+                    beta = math.sqrt(rave_equivalence / (3 * child_visits + rave_equivalence))
+                    score += beta * (amaf_wins[index] / amaf_visits[index] - score)
+                score += exploration_param * math.sqrt(log_visits / child_visits)
+                if score > best_score:
+                    best_score = score
+                    best_child = child
+            child = next_sibling[child]
         return best_child
 
-    def rollout_policy(self, valid_moves):
-        score_matrix = self.game_state.score_matrix
-        best_moves = []
-        max_score = -1
-        for move in valid_moves:
-            x, y = self.game_state.get_cell_coords_by_label(move)
-            score = score_matrix[x][y]
-            if score > max_score:
-                max_score = score
-                best_moves = [move]
-            elif score == max_score:
-                best_moves.append(move)
-        return random.choice(best_moves)
-
-    def rollout(self):
-        current_rollout_state = self.game_state.copy()
-        while not current_rollout_state.is_winner("X") and not current_rollout_state.is_winner("O") and not current_rollout_state.is_draw():
-            possible_moves = current_rollout_state.get_valid_moves()
-            action = self.rollout_policy(possible_moves)
-            current_rollout_state.move(action, current_rollout_state.current_player)        
-        if current_rollout_state.is_winner(self.game_state.current_player):
-            return 1
-        elif current_rollout_state.is_winner("X" if self.game_state.current_player == "O" else "O"):
-            return 0
-        else:
-            return 0.5  # draw
-
-    def expand(self):
-        untried_moves = self.untried_moves()
-        move = random.choice(untried_moves)
-        next_state = self.game_state.copy()
-        next_state.move(move, next_state.current_player)
-        child_node = Node(next_state, self, move)
-        self.add_child(child_node)
-        return child_node
-
-    def backpropagate(self, result):
-        self.update(result)
-        if self.parent:
-            self.parent.backpropagate(1 - result)
-                
\ No newline at end of file
+    def chosen_child(self, node):
+        '''
+        Return the child of node to play (-1 if node has no children): the best by proven value, or else by mean result.
+        '''
+        return max(self.children(node), key=lambda child: _move_value(self.wins[child], self.visits[child], self.proven[child]), default=-1)
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child != -1:
+            yield child
+            child = self.next_sibling[child]
+
+    def subtree(self, node):
+        '''
+        Return the nodes of the subtree rooted at node, in breadth-first order (node first).
+        '''
+        order = [node]
+        for parent in order:
+            order.extend(self.children(parent))
+        return order
+
+    def subtree_size(self, node):
+        return len(self.subtree(node))
+
+    def reroot(self, node, capacity=0):
+        '''
+        Make node the root, discarding every node outside its subtree and compacting the buffers.
+        '''
+        order = self.subtree(node)
+        index = {old: new for new, old in enumerate(order)}
+        self.size = len(order)
+        self.capacity = max(self.size, capacity)
+        padding = self.capacity - self.size
+        self.parent = array('i', [index.get(self.parent[old], -1) for old in order]) + array('i', [0]) * padding
+        self.move = array('i', [self.move[old] for old in order]) + array('i', [0]) * padding
+        self.wins = array('d', [self.wins[old] for old in order]) + array('d', [0.0]) * padding
+        self.visits = array('i', [self.visits[old] for old in order]) + array('i', [0]) * padding
+        cells = self.cells
+        self.amaf_wins = array('d', [value for old in order for value in self.amaf_wins[old * cells:(old + 1) * cells]]) + array('d', [0.0]) * (padding * cells)
+        self.amaf_visits = array('i', [value for old in order for value in self.amaf_visits[old * cells:(old + 1) * cells]]) + array('i', [0]) * (padding * cells)
+        self.proven = array('d', [self.proven[old] for old in order]) + array('d', [0.0]) * padding
+        self.first_child = array('i', [index.get(self.first_child[old], -1) for old in order]) + array('i', [0]) * padding
+        self.next_sibling = array('i', [index.get(self.next_sibling[old], -1) for old in order]) + array('i', [0]) * padding
+        self.next_sibling[0] = -1
+        self.untried = [self.untried[old] for old in order] + [0] * padding
+
+    def expand(self, node, game_state):
+        '''
+        Play a random untried move of node on game_state (which must be at node); return the new child.
+        With rave, the move is chosen at random among those with the best AMAF mean.
+        '''
+        move = self.amaf_move(node, self.untried[node]) if self.cells else _random_cell(self.untried[node])
+        self.untried[node] ^= 1 << (move - 1)
+        game_state.move(move, game_state.current_player)
+        return self.add_node(node, move, game_state)
+
+    def amaf_move(self, node, moves):
+        '''
+        Return a random one of the moves (a bitmask) with the highest AMAF mean at node (0.5 for a move with no statistics).
+        '''
+        amaf_wins, amaf_visits = self.amaf_wins, self.amaf_visits
+        start = node * self.cells - 1
+        best_value = -1.0
+        best_moves = 0
+        while moves:
+            bit = moves & -moves
+            moves ^= bit
+            index = start + bit.bit_length()
+            value = amaf_wins[index] / amaf_visits[index] if amaf_visits[index] else 0.5
+            if value > best_value:
+                best_value = value
+                best_moves = bit
+            elif value == best_value:
+                best_moves |= bit
+        return _random_cell(best_moves)
+
+    def solved(self) -> bool:
+        '''
+        True once the root is proven and has a child to play.
+        '''
+        return self.proven[0] >= 0 and self.first_child[0] != -1
+
+    def solve(self, node):
+        '''
+        Propagate the proof of node to its ancestors, as far as it decides them.
+        '''
+        proven, parent, untried = self.proven, self.parent, self.untried
+        above = parent[node]
+        while above != -1 and proven[above] < 0:
+            if proven[node] == 1.0:
+                proven[above] = 0.0
+            elif untried[above]:
+                return
+            else:
+                best = 0.0
+                for child in self.children(above):
+                    if proven[child] < 0:
+                        return
+                    best = max(best, proven[child])
+                proven[above] = 1 - best
+            node, above = above, parent[above]
+
+    def backpropagate(self, node, result):
+        '''
+        Add result (for the player who moved into node) to node and its ancestors, alternating perspectives.
+        '''
+        wins, visits, parent = self.wins, self.visits, self.parent
+        while node != -1:
+            visits[node] += 1
+            wins[node] += result
+            result = 1 - result
+            node = parent[node]
+
+    def backpropagate_amaf(self, node, result, mover_mask, other_mask):
+        '''
+        backpropagate, also updating the AMAF statistics: at each ancestor, every cell that the player to move
+        there claimed at any point of the simulation (mover_mask and other_mask are the final masks of the
+        player who moved into node and of their opponent) is credited with that player's result.
+        '''
+        wins, visits, parent, cells = self.wins, self.visits, self.parent, self.cells
+        amaf_wins, amaf_visits = self.amaf_wins, self.amaf_visits
+        mover_cells, other_cells = _cells(mover_mask), _cells(other_mask)
+        while node != -1:
+            visits[node] += 1
+            wins[node] += result
+            above = parent[node]
+            if above != -1:
+                start = above * cells - 1
+                for label in mover_cells:
+                    amaf_visits[start + label] += 1
+                    amaf_wins[start + label] += result
+            result = 1 - result
+            mover_cells, other_cells = other_cells, mover_cells
+            node = above
+
+
+def _cells(mask):
+    '''
+    Return the labels of the set bits of mask (bit i is cell i + 1), lowest first.
+    '''
+    labels = []
+    while mask:
+        bit = mask & -mask
+        labels.append(bit.bit_length())
+        mask ^= bit
+    return labels
+
+
+def _random_cell(mask):
+    '''
+    Return the label of a uniformly chosen cell among the set bits of mask (bit i is cell i + 1).
+    '''
+    skip = random.randrange(mask.bit_count())
+    while skip:
+        mask &= mask - 1
+        skip -= 1
+    return (mask & -mask).bit_length()
@@ -1,50 +1,75 @@
 # plotter.py -  Plotter class to graph the tabulated results of the simulations.
-import json
-import matplotlib.pyplot as plt
-import numpy as np
-
-with open("results.json", "r") as f:
-    results = json.load(f)
-
-labels = list(results.keys())
-x_wins = [matchup["X"] for matchup in results.values()]
-o_wins = [matchup["O"] for matchup in results.values()]
-draws = [matchup["Draw"] for matchup in results.values()]
-times = [matchup["Time"] for matchup in results.values()]
-
-x = np.arange(len(labels))
-width = 0.2
-
-fig, ax1 = plt.subplots()
-rects1 = ax1.bar(x - 1.5*width, x_wins, width, label='X Wins')
-rects2 = ax1.bar(x - 0.5*width, o_wins, width, label='O Wins')
-rects3 = ax1.bar(x + 0.5*width, draws, width, label='Draws')
-
-ax1.set_ylabel('Number of games')
-ax1.set_title('Results of AI vs AI Tic-Tac-Toe simulations')
-ax1.set_xticks(x)
-ax1.set_xticklabels(labels, rotation=45, ha='right')
-ax1.legend(loc='upper left')
-
-ax2 = ax1.twinx()
-ax2.set_yscale('log')
-ax2.set_ylim(min(times), max(times)*1.1)
-ax2.plot(x, times, marker='o', label='Time per game (s)', color='purple', linestyle=(0, (1, 2)))
-ax2.set_ylabel('Time per game (s)')
-ax2.legend(loc='upper right')
-
-def autolabel(rects):
-    for rect in rects:
-        height = rect.get_height()
-        ax1.annotate('{}'.format(height),
-                    xy=(rect.get_x() + rect.get_width() / 2, height),
-                    xytext=(0, 3),
-                    textcoords="offset points",
-                    ha='center', va='bottom')
-
-autolabel(rects1)
-autolabel(rects2)
-autolabel(rects3)
-
-fig.tight_layout()
-plt.show()
+import results_store
+
+
+class ResultsPlotter:
+    '''
+    ResultsPlotter: graphs the outcome counts per matchup (with Wilson 95% confidence intervals as error bars)
+                    and the time per game. The records are aggregated as they stream from the store (see
+                    results_store.stream_aggregate); nothing is drawn, and matplotlib is not imported, until plot().
+    '''
+    def __init__(self, results_file=results_store.DEFAULT_PATH):
+        self.results_file = results_file
+        self.results = {}
+
+    def __call__(self):
+        self.load_results()
+        if not self.results:
+            print(f"No results found in {self.results_file}")
+            return None
+        return self.plot()
+
+    def load_results(self):
+        self.results = {key: stats.summary() for key, stats in results_store.stream_aggregate(self.results_file).items()}
+
+    def plot(self, show=True):
+        import matplotlib.pyplot as plt
+        import numpy as np
+
+        labels = list(self.results.keys())
+        times = [matchup["Time"] for matchup in self.results.values()]
+
+        x = np.arange(len(labels))
+        width = 0.2
+
+        fig, ax1 = plt.subplots()
+        for offset, (outcome, label) in zip((-1.5, -0.5, 0.5), (('X', 'X Wins'), ('O', 'O Wins'), ('Draw', 'Draws'))):
+            counts = np.array([matchup[outcome] for matchup in self.results.values()])
+            totals = np.array([matchup['X'] + matchup['O'] + matchup['Draw'] for matchup in self.results.values()])
+            intervals = np.array([matchup['Intervals'][outcome] for matchup in self.results.values()]).reshape(-1, 2)
+            errors = np.clip([counts - intervals[:, 0] * totals, intervals[:, 1] * totals - counts], 0, None)
+            rects = ax1.bar(x + offset * width, counts, width, yerr=errors, capsize=2, label=label)
+            self.autolabel(ax1, rects)
+
+        ax1.set_ylabel('Number of games')
+        ax1.set_title('Results of AI vs AI Tic-Tac-Toe simulations')
+        ax1.set_xticks(x)
+        ax1.set_xticklabels(labels, rotation=45, ha='right')
+        ax1.legend(loc='upper left')
+
+        ax2 = ax1.twinx()
+        ax2.set_yscale('log')
+        ax2.set_ylim(min(times), max(times)*1.1)
+        ax2.plot(x, times, marker='o', label='Time per game (s)', color='purple', linestyle=(0, (1, 2)))
+        ax2.set_ylabel('Time per game (s)')
+        ax2.legend(loc='upper right')
+
+        fig.tight_layout()
+        if show:
+            plt.show()
+        return fig
+
+    @staticmethod
+    def autolabel(ax, rects):
+        for rect in rects:
+            height = rect.get_height()
+            ax.annotate('{}'.format(height),
+                        xy=(rect.get_x() + rect.get_width() / 2, height),
+                        xytext=(0, 3),
+                        textcoords="offset points",
+                        ha='center', va='bottom')
+
+
+if __name__ == '__main__':
+    plotter = ResultsPlotter()
+    plotter()
@@ -1,32 +1,43 @@
 # presenter.py - Presenter class for the Tic-Tac-Toe game simulation results.
-import json
 import os
+import results_store
 import time
 
 class ResultsPresenter:
-    def __init__(self, results_file='results.json'):
+    '''
+    ResultsPresenter:   prints the simulation results per matchup: outcome rates with Wilson 95% confidence
+                        intervals, the time per episode and, where recorded, game times and decision latencies.
+                        The records are aggregated as they stream from the store (see results_store.stream_aggregate).
+    '''
+    def __init__(self, results_file=results_store.DEFAULT_PATH):
         self.results_file = results_file
+        self.results = {}
     
-    def __call__(self):
-        presenter = ResultsPresenter()
-        presenter.load_results()
-        presenter.display_results()
+    def __call__(self, by_ply=False):
+        self.load_results()
+        self.display_results(by_ply)
 
     def load_results(self):
-        try:
-            with open(self.results_file, 'r') as f:
-                self.results = json.load(f)
-        except FileNotFoundError:
+        # the store's records, or results.json until a store has been recorded
+        self.results = {key: stats.summary() for key, stats in results_store.stream_aggregate(self.results_file).items()}
+        if not self.results:
             print(f"No results found in {self.results_file}")
-            self.results = {}
 
-    def display_results(self):
+    def label(self, key):
+        '''
+        The matchup key (or '' for a header) padded to the longest key, which for boards other than 3x3 names the board.
+        '''
+        width = max([30] + [len(matchup) + 1 for matchup in self.results])
+        return (key + ':' if key else '').ljust(width)
+
+    def display_results(self, by_ply=False):
         if not self.results:
             print("No results to display")
             return
-        mod_time = os.path.getmtime(self.results_file)
-        print(f"\nResults from {self.results_file}: [Last modified time: {format(time.ctime(mod_time))}]\n")
-        print("{:<30} {:^11} {:^11} {:^11} {:^11} {:^11}".format("", "X Wins", "O Wins", "Draws", "Total", "(W - L - D) time/match"))
+        source = self.results_file if os.path.exists(self.results_file) else os.path.join(os.path.dirname(self.results_file), results_store.LEGACY_PATH)
+        mod_time = max(os.path.getmtime(path) for path in (source, source + '-wal') if os.path.exists(path))
+        print(f"\nResults from {source}: [Last modified time: {format(time.ctime(mod_time))}]\n")
+        print("{:<30} {:^11} {:^11} {:^11} {:^11} {:^11}".format(self.label(""), "X Wins", "O Wins", "Draws", "Total", "(W - L - D) time/match"))
         for key, result in self.results.items():
             sum = result['X'] + result['O'] + result['Draw']
             x_percent = "{:.1f}%".format((result['X'] / sum) * 100)
@@ -34,11 +45,52 @@ class ResultsPresenter:
             draw_percent = "{:.1f}%".format((result['Draw'] / sum) * 100)
             w_l_draw = f"({result['X']:<5} - {result['O']:<5} - {result['Draw']:<5})"
             average_time = "{:.5f}".format(result['Time'])
-            print("{:<30} {:^11} {:^11} {:^11} {:^11} {:^11} {:<5}".format(key + ":", x_percent, o_percent, draw_percent, sum, w_l_draw, average_time))
+            print("{:<30} {:^11} {:^11} {:^11} {:^11} {:^11} {:<5}".format(self.label(key), x_percent, o_percent, draw_percent, sum, w_l_draw, average_time))
+        print()
+        self.display_intervals()
+        if any('Game time' in result for result in self.results.values()):
+            self.display_game_times()
+        if any('Latency' in result for result in self.results.values()):
+            self.display_latency(by_ply)
+
+    def display_intervals(self):
+        print("Outcome rates with 95% confidence intervals (Wilson):")
+        print("{:<30} {:^21} {:^21} {:^21}".format(self.label(""), "X Wins", "O Wins", "Draws"))
+        for key, result in self.results.items():
+            rates = []
+            for outcome in ('X', 'O', 'Draw'):
+                low, high = result['Intervals'][outcome]
+                rates.append(f"{low * 100:5.1f}% - {high * 100:5.1f}%")
+            print("{:<30} {:^21} {:^21} {:^21}".format(self.label(key), *rates))
+        print()
+
+    def display_game_times(self):
+        print("Game time (milliseconds, from per-game records):")
+        print("{:<30} {:>9} {:>9} {:>9} {:>9} {:>9}".format(self.label(""), "Games", "p50", "p95", "p99", "max"))
+        for key, result in self.results.items():
+            if 'Game time' in result:
+                stats = result['Game time']
+                print("{:<30} {:>9} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+                    self.label(key), stats['count'], stats['p50'] / 1000, stats['p95'] / 1000, stats['p99'] / 1000, stats['max'] / 1000))
+        print()
+
+    def display_latency(self, by_ply=False):
+        '''
+        Print each player's decision time percentiles (microseconds) per matchup; by_ply adds a row per ply.
+        '''
+        print("Decision latency (microseconds):")
+        print("{:<30} {:<16} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}".format(self.label(""), "Player", "Ply", "Moves", "p50", "p95", "p99", "max"))
+        for key, result in self.results.items():
+            for player, latency in result.get('Latency', {}).items():
+                rows = [('all', latency['all'])]
+                if by_ply:
+                    rows += sorted(latency['plies'].items(), key=lambda item: int(item[0]))
+                for ply, stats in rows:
+                    print("{:<30} {:<16} {:>6} {:>9} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}".format(
+                        self.label(key), player, ply, stats['count'], stats['p50'], stats['p95'], stats['p99'], stats['max']))
         print()
 
 # Usage example:
 if __name__ == '__main__':
     presenter = ResultsPresenter()
-    presenter.load_results()
-    presenter.display_results()
+    presenter()
@@ -0,0 +1,184 @@
+# qlearning.py - tabular Q-learning by self-play, trained on NumPy board arrays; the Q-table behind AI_ML_RL.
+import os
+import numpy as np
+import tablebase
+import vectorized
+from vectorized import EMPTY, X, O
+from atomic_file import atomic_write
+from players import QTABLE_MAX_CELLS as MAX_CELLS
+
+TRAINING_SEED = 0 # for the tables trained on first use, so that every machine learns the same one
+
+_open_tables = {}
+
+
+class QTable:
+    '''
+    QTable: a trained Q-table, memory-mapped read-only, so that every process using the same file shares one
+            copy in the page cache and loading costs nothing up front. Row i holds the learned value of each
+            move for the player to move in the position whose base-3 index is i (see tablebase.Tablebase):
+            1 for a win, 0 for a draw, -1 for a loss, discounted by the moves until the game ends.
+    '''
+    def __init__(self, path: str) -> None:
+        self.values = np.load(path, mmap_mode='r')
+        self.cells = self.values.shape[1]
+        if self.values.shape != (3 ** self.cells, self.cells):
+            raise ValueError(f'{path} is not a Q-table')
+        self.ternary = tablebase.ternary_table(self.cells)
+
+    def best_moves(self, x_mask: int, o_mask: int):
+        '''
+        Return the empty cells with the highest value in the position.
+        '''
+        row = self.values[self.ternary[x_mask] + 2 * self.ternary[o_mask]].tolist()
+        taken = x_mask | o_mask
+        legal = [cell for cell in range(self.cells) if not taken >> cell & 1]
+        best = max(row[cell] for cell in legal)
+        return [cell + 1 for cell in legal if row[cell] == best]
+
+
+def default_path(geometry) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), f'qtable_{geometry.rows}x{geometry.cols}_{geometry.k}.npy')
+
+
+def load(path=None, geometry=None) -> QTable:
+    '''
+    Return the (shared, memory-mapped) Q-table at path (default: default_path(geometry)), training (with
+    TRAINING_SEED) and saving one for geometry first if the file does not exist.
+    '''
+    path = path or default_path(geometry)
+    if path not in _open_tables:
+        if not os.path.exists(path):
+            save(train(geometry, seed=TRAINING_SEED), path)
+        _open_tables[path] = QTable(path)
+    return _open_tables[path]
+
+
+def save(q, path):
+    with atomic_write(path, 'wb') as f:
+        np.save(f, q)
+
+
+def train(geometry, episodes=500_000, batch_size=4096, learning_rate=0.5, discount=0.9, exploration=(1.0, 0.05), seed=None):
+    '''
+    Learn a Q-table for geometry's board by self-play: batch_size games at a time are played in lock-step, each
+    move epsilon-greedy on the table (epsilon falling linearly over the batches from exploration[0] to
+    exploration[1]). One table serves both sides, each value being for the player to move, so each move's value
+    moves towards its result if it ends the game (1 win, 0 draw), and otherwise towards minus the discounted
+    best value of the opponent's reply. Where games of a batch make the same move in the same position, one
+    update of it is kept. Return the (3**cells, cells) float32 table.
+    '''
+    if geometry.cells > MAX_CELLS:
+        raise ValueError(f'A Q-table for {geometry.cells} cells would have 3**{geometry.cells} rows; at most {MAX_CELLS} cells are supported')
+    arrays = vectorized.BoardArrays(geometry)
+    cells = geometry.cells
+    q = np.zeros((3 ** cells, cells), dtype=np.float32)
+    powers = 3 ** np.arange(cells, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    batches = max(1, -(-episodes // batch_size))
+    for batch in range(batches):
+        epsilon = exploration[0] + (exploration[1] - exploration[0]) * batch / max(1, batches - 1)
+        games = min(batch_size, episodes - batch * batch_size)
+        boards = np.zeros((games, cells), dtype=np.int8)
+        states = np.zeros(games, dtype=np.int64)
+        active = np.arange(games)
+        player = X
+        while active.size:
+            board, state = boards[active], states[active]
+            empty = board == EMPTY
+            greedy = np.argmax(np.where(empty, q[state], -np.inf), axis=1)
+            explore = rng.random(active.size) < epsilon
+            moves = np.where(explore, vectorized.random_policy(board, player, arrays, rng), greedy)
+            board[np.arange(active.size), moves] = player
+            next_state = state + player * powers[moves]
+            won = (board[:, arrays.lines] == player).all(axis=2).any(axis=1)
+            open_cells = board == EMPTY
+            full = ~open_cells.any(axis=1)
+            with np.errstate(invalid='ignore'):
+                reply = np.where(open_cells, q[next_state], -np.inf).max(axis=1)
+            target = np.where(won, 1.0, np.where(full, 0.0, -discount * reply))
+            q[state, moves] += learning_rate * (target - q[state, moves])
+            boards[active], states[active] = board, next_state
+            active = active[~(won | full)]
+            player = X + O - player
+    return q
+
+
+def q_policy(q):
+    '''
+    A vectorized policy (see vectorized.POLICIES) for the Q-table q: a random choice among each board's best moves.
+    '''
+    powers = 3 ** np.arange(q.shape[1], dtype=np.int64)
+
+    def policy(boards, player, arrays, rng):
+        values = np.where(boards == EMPTY, q[boards.astype(np.int64) @ powers], -np.inf)
+        best = values == values.max(axis=1, keepdims=True)
+        return np.argmax(rng.random(boards.shape) * best, axis=1)
+    return policy
+
+
+def evaluate(q, geometry, games=10_000, seed=None):
+    '''
+    Play the Q-table's policy against AI_Rando's and AI_Jack's (vectorized) as X and as O; return
+    {'AI_ML_RL(X) vs. AI_Rando(O)': {'X': wins, 'O': wins, 'Draw': draws}, ...}.
+    '''
+    arrays = vectorized.BoardArrays(geometry)
+    rng = np.random.default_rng(seed)
+    learned = q_policy(q)
+    results = {}
+    for name, opponent in (('AI_Rando', vectorized.random_policy), ('AI_Jack', vectorized.jack_policy)):
+        for x_name, o_name, policies in (('AI_ML_RL', name, {X: learned, O: opponent}), (name, 'AI_ML_RL', {X: opponent, O: learned})):
+            outcomes = vectorized.play_out(np.zeros((games, geometry.cells), dtype=np.int8), X, policies, arrays, rng)
+            results[f'{x_name}(X) vs. {o_name}(O)'] = {'X': int(np.count_nonzero(outcomes == X)), 'O': int(np.count_nonzero(outcomes == O)),
+                                                       'Draw': int(np.count_nonzero(outcomes == EMPTY))}
+    return results
+
+
+def _reachable(geometry):
+    '''
+    Yield (x_mask, o_mask) for every position reachable from the empty board with a move to play.
+    '''
+    seen = set()
+    pending = [(0, 0)]
+    while pending:
+        x_mask, o_mask = pending.pop()
+        if (x_mask, o_mask) in seen:
+            continue
+        seen.add((x_mask, o_mask))
+        if any(mask & line == line for mask in (x_mask, o_mask) for line in geometry.win_masks) or x_mask | o_mask == geometry.full_mask:
+            continue
+        yield x_mask, o_mask
+        x_to_move = bin(x_mask).count('1') == bin(o_mask).count('1')
+        for cell in range(geometry.cells):
+            if not (x_mask | o_mask) >> cell & 1:
+                pending.append((x_mask | 1 << cell, o_mask) if x_to_move else (x_mask, o_mask | 1 << cell))
+
+
+if __name__ == '__main__':
+    import argparse
+    import main
+    from time import perf_counter
+    parser = argparse.ArgumentParser(description='Train the AI_ML_RL Q-table by self-play')
+    parser.add_argument('--grid-size', type=int, default=3)
+    parser.add_argument('--cols', type=int, help='the number of columns (default: --grid-size)')
+    parser.add_argument('--k', type=int, help='the number in a row that wins (default: the whole row)')
+    parser.add_argument('--episodes', type=int, default=500_000)
+    parser.add_argument('--batch-size', type=int, default=4096)
+    parser.add_argument('--seed', type=int, default=TRAINING_SEED)
+    parser.add_argument('--output', help='the .npy file to write (default: the one AI_ML_RL loads for the board)')
+    args = parser.parse_args()
+    geometry = main.GridGeometry.for_size(args.grid_size, args.cols, args.k)
+    path = args.output or default_path(geometry)
+    time_begin = perf_counter()
+    q = train(geometry, args.episodes, args.batch_size, seed=args.seed)
+    print(f'Trained on {args.episodes} self-play games in {perf_counter() - time_begin:.1f}s')
+    save(q, path)
+    print(f'Wrote {path}: {q.nbytes} bytes')
+    for matchup, result in evaluate(q, geometry, seed=args.seed).items():
+        print(f'  {matchup}: {result}')
+    if geometry.key == (3, 3, 3):
+        table = tablebase.load(geometry=geometry)
+        learned = QTable(path)
+        graded = [table.is_best_move(x_mask, o_mask, learned.best_moves(x_mask, o_mask)[0])
+                  for x_mask, o_mask in _reachable(geometry)]
+        print(f'  Best move (by the tablebase) in {sum(graded)} of {len(graded)} reachable positions')
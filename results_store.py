@@ -0,0 +1,408 @@
+# results_store.py - the simulation results: an append-only SQLite log of batches (and games) with a per-matchup summary.
+import datetime
+import json
+import latency
+import math
+import os
+import sqlite3
+from atomic_file import atomic_write
+
+DEFAULT_PATH = 'results.db'
+LEGACY_PATH = 'results.json'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    matchup TEXT NOT NULL,
+    x_player TEXT NOT NULL,
+    o_player TEXT NOT NULL,
+    grid_size INTEGER NOT NULL,
+    episodes INTEGER NOT NULL,
+    x_wins INTEGER NOT NULL,
+    o_wins INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    seconds_per_episode REAL NOT NULL,
+    seed TEXT,
+    workers INTEGER,
+    x_params TEXT,
+    o_params TEXT,
+    extra TEXT,
+    cols INTEGER,
+    k INTEGER
+);
+CREATE TABLE IF NOT EXISTS games (
+    batch_id INTEGER NOT NULL REFERENCES batches(id),
+    game INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    seconds REAL,
+    PRIMARY KEY (batch_id, game)
+);
+CREATE TABLE IF NOT EXISTS matchups (
+    matchup TEXT PRIMARY KEY,
+    x_wins INTEGER NOT NULL,
+    o_wins INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    seconds_per_episode REAL NOT NULL,
+    last_batch INTEGER NOT NULL,
+    latency TEXT,
+    latency_histograms TEXT
+);
+'''
+
+
+class ResultsStore:
+    '''
+    ResultsStore:   simulation results in a SQLite database in WAL mode, so several simulator processes can
+                    record at once while presenters read.
+
+                    batches     - one row per recorded batch (never updated): the tallies, seconds per
+                                  episode, seed, board (grid_size rows, cols and k in a row), worker count
+                                  and both players' parameters
+                    games       - optionally, each game of a batch: its outcome and seconds
+                    matchups    - the running totals per matchup and board (see matchup_key), updated in
+                                  the same transaction as the batch insert, so recording is O(batch);
+                                  the time is the latest batch's, and the decision latencies are merged
+                                  from the batches' histograms (see _add_to_matchup)
+    '''
+    def __init__(self, path=DEFAULT_PATH, timeout=30.0) -> None:
+        self.path = path
+        # autocommit mode; each write is an explicit BEGIN IMMEDIATE transaction, so writers queue on the lock (for up to timeout seconds)
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        if not self._is_current(self.connection):
+            self._migrate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def matchup_key(x_name, o_name, rows=3, cols=None, k=None):
+        '''
+        'AI_Jack(X) vs. AI_Rando(O)' for 3x3 tic-tac-toe (the only board of results.json), else qualified
+        by the board, e.g. 'AI_Jack(X) vs. AI_Rando(O) on 15x15 k=5'.
+        '''
+        cols = rows if cols is None else cols
+        k = max(rows, cols) if k is None else k
+        key = f'{x_name}(X) vs. {o_name}(O)'
+        return key if (rows, cols, k) == (3, 3, 3) else f'{key} on {rows}x{cols} k={k}'
+
+    @staticmethod
+    def _columns(cursor, table):
+        return [column[1] for column in cursor.execute(f'PRAGMA table_info({table})')]
+
+    def _is_current(self, cursor) -> bool:
+        return 'latency_histograms' in self._columns(cursor, 'matchups') and 'cols' in self._columns(cursor, 'batches')
+
+    def _migrate(self):
+        '''
+        Bring an older store up to date. The columns are checked again once the write lock is held, so that
+        when several processes open the same old store at once, only the first migrates it.
+        '''
+        cursor = self.connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if 'latency' not in self._columns(cursor, 'matchups'): # a store from before latencies were recorded
+                cursor.execute('ALTER TABLE matchups ADD COLUMN latency TEXT')
+            if 'latency_histograms' not in self._columns(cursor, 'matchups'): # ... or before they were merged across batches
+                cursor.execute('ALTER TABLE matchups ADD COLUMN latency_histograms TEXT')
+            if 'cols' not in self._columns(cursor, 'batches'): # a store from before boards were told apart
+                self._add_board_columns(cursor)
+            cursor.execute('COMMIT')
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+
+    def _add_board_columns(self, cursor):
+        '''
+        Add the cols and k columns to an older store (whose k, if not the default, is in extra), re-key the batches
+        of boards other than 3x3 and rebuild the matchup totals, which had added up every board's games together
+        (on cursor, in _migrate's transaction).
+        '''
+        cursor.execute('ALTER TABLE batches ADD COLUMN cols INTEGER')
+        cursor.execute('ALTER TABLE batches ADD COLUMN k INTEGER')
+        for batch_id, x_name, o_name, rows, extra in cursor.execute('SELECT id, x_player, o_player, grid_size, extra FROM batches').fetchall():
+            k = (json.loads(extra) if extra else {}).get('k', rows)
+            cursor.execute('UPDATE batches SET cols = ?, k = ?, matchup = ? WHERE id = ?',
+                           (rows, k, self.matchup_key(x_name, o_name, rows, rows, k), batch_id))
+        cursor.execute('DELETE FROM matchups')
+        for key, x_wins, o_wins, draws, seconds, batch_id, extra in cursor.execute(
+                'SELECT matchup, x_wins, o_wins, draws, seconds_per_episode, id, extra FROM batches ORDER BY id').fetchall():
+            extra = json.loads(extra) if extra else {}
+            self._add_to_matchup(cursor, key, x_wins, o_wins, draws, seconds, batch_id, extra.get('Latency'), extra.get('Latency histograms'))
+
+    def _add_to_matchup(self, cursor, key, x_wins, o_wins, draws, seconds, batch_id, latency_summary=None, latency_histograms=None):
+        '''
+        Add a batch to its matchup's running totals (on cursor, in the caller's transaction). A batch's latency histograms
+        (see latency.LatencyRecorder.to_json) are merged with the matchup's and the percentiles recomputed over all of them;
+        percentiles alone (batches from before histograms were kept, or imported from results.json) cannot be merged, so
+        they are only kept, the latest winning, while no batch of the matchup has had histograms.
+        '''
+        if latency_histograms is not None:
+            merged = latency.LatencyRecorder.from_json(latency_histograms)
+            row = cursor.execute('SELECT latency_histograms FROM matchups WHERE matchup = ?', (key,)).fetchone()
+            if row and row[0]:
+                merged.merge(latency.LatencyRecorder.from_json(json.loads(row[0])))
+            latency_summary, latency_histograms = merged.summary(), merged.to_json()
+        cursor.execute('INSERT INTO matchups (matchup, x_wins, o_wins, draws, seconds_per_episode, last_batch, latency, latency_histograms) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                       'ON CONFLICT (matchup) DO UPDATE SET x_wins = x_wins + excluded.x_wins, o_wins = o_wins + excluded.o_wins, '
+                       'draws = draws + excluded.draws, seconds_per_episode = excluded.seconds_per_episode, last_batch = excluded.last_batch, '
+                       'latency = CASE WHEN excluded.latency_histograms IS NOT NULL OR latency_histograms IS NULL '
+                       'THEN COALESCE(excluded.latency, latency) ELSE latency END, '
+                       'latency_histograms = COALESCE(excluded.latency_histograms, latency_histograms)',
+                       (key, x_wins, o_wins, draws, seconds, batch_id, _to_json(latency_summary), _to_json(latency_histograms)))
+
+    def record_batch(self, x_name, o_name, results, grid_size=3, seed=None, workers=1,
+                     x_params=None, o_params=None, games=None, extra=None, latency_summary=None, cols=None, k=None,
+                     latency_histograms=None) -> int:
+        '''
+        Append a batch of x_name vs o_name games (results as returned by TicTacToeSimulator.simulate:
+        {'X', 'O', 'Draw', 'Time'}) on a board of grid_size rows and cols columns (default: square), won by
+        k in a row (default: a whole row), and, if given, its games [(outcome, seconds)] and decision
+        latencies (see latency.LatencyRecorder.summary, and .to_json for the histograms); return the batch id.
+        '''
+        if latency_summary is not None:
+            extra = dict(extra or {}, Latency=latency_summary)
+        if latency_histograms is not None:
+            extra = dict(extra or {}, **{'Latency histograms': latency_histograms})
+        cols = grid_size if cols is None else cols
+        k = max(grid_size, cols) if k is None else k
+        key = self.matchup_key(x_name, o_name, grid_size, cols, k)
+        episodes = results['X'] + results['O'] + results['Draw']
+        recorded_at = datetime.datetime.now().isoformat(timespec='milliseconds')
+        cursor = self.connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('INSERT INTO batches (recorded_at, matchup, x_player, o_player, grid_size, episodes, x_wins, o_wins, draws, '
+                           'seconds_per_episode, seed, workers, x_params, o_params, extra, cols, k) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           (recorded_at, key, x_name, o_name, grid_size, episodes, results['X'], results['O'], results['Draw'],
+                            results['Time'], None if seed is None else str(seed), workers,
+                            _to_json(x_params), _to_json(o_params), _to_json(extra), cols, k))
+            batch_id = cursor.lastrowid
+            if games:
+                cursor.executemany('INSERT INTO games (batch_id, game, outcome, seconds) VALUES (?, ?, ?, ?)',
+                                   ((batch_id, game, outcome, seconds) for game, (outcome, seconds) in enumerate(games)))
+            # only the latest batch's time is kept, so the summary follows the AIs as their performance changes
+            self._add_to_matchup(cursor, key, results['X'], results['O'], results['Draw'], results['Time'], batch_id,
+                                 latency_summary, latency_histograms)
+            cursor.execute('COMMIT')
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        return batch_id
+
+    def aggregate(self) -> dict:
+        '''
+        The totals per matchup (and board, see matchup_key), in results.json's format: {matchup: {'X': wins, 'O': wins, 'Draw': draws, 'Time': seconds}},
+        plus 'Latency' for the matchups with recorded decision latencies.
+        '''
+        aggregate = {}
+        for key, x_wins, o_wins, draws, seconds, latency_json in self.connection.execute(
+                'SELECT matchup, x_wins, o_wins, draws, seconds_per_episode, latency FROM matchups ORDER BY matchup'):
+            aggregate[key] = {'X': x_wins, 'O': o_wins, 'Draw': draws, 'Time': seconds}
+            if latency_json is not None:
+                aggregate[key]['Latency'] = json.loads(latency_json)
+        return aggregate
+
+    def last_recorded(self):
+        '''
+        When the latest batch was recorded (an ISO timestamp), or None if there are none.
+        '''
+        return self.connection.execute('SELECT MAX(recorded_at) FROM batches').fetchone()[0]
+
+    def iter_batches(self, matchup=None):
+        '''
+        Yield each recorded batch (oldest first) as a dict, its parameters decoded; optionally for one matchup.
+        '''
+        query = 'SELECT * FROM batches' + (' WHERE matchup = ?' if matchup else '') + ' ORDER BY id'
+        cursor = self.connection.execute(query, (matchup,) if matchup else ())
+        columns = [column[0] for column in cursor.description]
+        for row in cursor:
+            batch = dict(zip(columns, row))
+            for column in ('x_params', 'o_params', 'extra'):
+                batch[column] = json.loads(batch[column]) if batch[column] else None
+            yield batch
+
+    def iter_games(self, batch_id):
+        '''
+        Yield (outcome, seconds) for each recorded game of a batch.
+        '''
+        yield from self.connection.execute('SELECT outcome, seconds FROM games WHERE batch_id = ? ORDER BY game', (batch_id,))
+
+    def iter_all_games(self):
+        '''
+        Yield (matchup, outcome, seconds) for every recorded game, streamed from the database.
+        '''
+        yield from self.connection.execute('SELECT batches.matchup, games.outcome, games.seconds FROM games '
+                                           'JOIN batches ON games.batch_id = batches.id ORDER BY games.batch_id, games.game')
+
+    def export_json(self, path=LEGACY_PATH):
+        '''
+        Write the aggregate to path in results.json's format (atomically, via a temporary file).
+        '''
+        with atomic_write(path) as f:
+            json.dump(self.aggregate(), f, indent=4)
+
+    def import_json(self, path=LEGACY_PATH):
+        '''
+        Record each matchup of a results.json file as one batch (its parameters unknown); return the number imported.
+        '''
+        with open(path, 'r') as f:
+            legacy_results = json.load(f)
+        for key, result in legacy_results.items():
+            pairing, _, board = key.partition(' on ')
+            x_name, o_name = (player.rsplit('(', 1)[0] for player in pairing.split(' vs. '))
+            rows, cols, k = 3, 3, 3
+            if board: # e.g. '15x15 k=5'
+                size, k = board.split(' k=')
+                rows, cols = size.split('x')
+            self.record_batch(x_name, o_name, result, int(rows), extra={'imported_from': os.path.basename(path)}, latency_summary=result.get('Latency'),
+                              cols=int(cols), k=int(k))
+        return len(legacy_results)
+
+
+def load_aggregate(path=DEFAULT_PATH) -> dict:
+    '''
+    The totals per matchup from a results store, or from a results.json file (a .json path, or the
+    fallback when the store does not exist yet); {} if there are no results.
+    '''
+    if not path.endswith('.json') and os.path.exists(path):
+        with ResultsStore(path) as store:
+            return store.aggregate()
+    if not path.endswith('.json'):
+        path = os.path.join(os.path.dirname(path), LEGACY_PATH)
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class MatchupStats:
+    '''
+    MatchupStats:   the running aggregate of one matchup's records, built in a single pass in constant memory:
+                    the outcome tallies, the latest time per episode, the decision latencies merged over the
+                    batches (as ResultsStore._add_to_matchup does), and (from per-game records) a histogram
+                    of game durations.
+    '''
+    __slots__ = ('x_wins', 'o_wins', 'draws', 'seconds_per_episode', 'latencies', 'latency_summary', 'game_times')
+
+    def __init__(self) -> None:
+        self.x_wins = self.o_wins = self.draws = 0
+        self.seconds_per_episode = 0.0
+        self.latencies = latency.LatencyRecorder()
+        self.latency_summary = None # the latest percentiles of a batch without histograms, which cannot be merged
+        self.game_times = latency.LatencyHistogram() # nanoseconds
+
+    @property
+    def episodes(self) -> int:
+        return self.x_wins + self.o_wins + self.draws
+
+    def add_batch(self, batch) -> None:
+        '''
+        Count a batch (a row of iter_batches; batches arrive oldest first, so the latest time wins).
+        '''
+        self.x_wins += batch['x_wins']
+        self.o_wins += batch['o_wins']
+        self.draws += batch['draws']
+        self.seconds_per_episode = batch['seconds_per_episode']
+        extra = batch['extra'] or {}
+        if 'Latency histograms' in extra:
+            self.latencies.merge(latency.LatencyRecorder.from_json(extra['Latency histograms']))
+        elif 'Latency' in extra:
+            self.latency_summary = extra['Latency']
+
+    def add_game(self, seconds) -> None:
+        if seconds is not None:
+            self.game_times.record(int(seconds * 1e9))
+
+    def interval(self, wins, z=1.96):
+        '''
+        The Wilson score interval (low, high) for the rate wins / episodes, at z standard deviations (95% by default).
+        '''
+        n = self.episodes
+        if not n:
+            return 0.0, 1.0
+        p = wins / n
+        centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+        half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+    def summary(self) -> dict:
+        '''
+        In results.json's format ({'X', 'O', 'Draw', 'Time'}, and 'Latency' if recorded), plus 'Intervals'
+        ({'X': (low, high), ...}) and, given per-game records, 'Game time' (percentiles in microseconds).
+        '''
+        summary = {'X': self.x_wins, 'O': self.o_wins, 'Draw': self.draws, 'Time': self.seconds_per_episode,
+                   'Intervals': {'X': self.interval(self.x_wins), 'O': self.interval(self.o_wins), 'Draw': self.interval(self.draws)}}
+        if self.latencies.histograms:
+            summary['Latency'] = self.latencies.summary()
+        elif self.latency_summary is not None:
+            summary['Latency'] = self.latency_summary
+        if self.game_times.count:
+            summary['Game time'] = self.game_times.summary()
+        return summary
+
+
+def iter_batch_records(path=DEFAULT_PATH):
+    '''
+    Stream the batch records of a results store, oldest first (as ResultsStore.iter_batches rows); a results.json
+    file (a .json path, or the fallback when the store does not exist yet) gives one record per matchup.
+    '''
+    if not path.endswith('.json') and os.path.exists(path):
+        with ResultsStore(path) as store:
+            yield from store.iter_batches()
+        return
+    for key, result in load_aggregate(path).items():
+        yield {'matchup': key, 'x_wins': result['X'], 'o_wins': result['O'], 'draws': result['Draw'],
+               'seconds_per_episode': result['Time'], 'extra': {'Latency': result['Latency']} if 'Latency' in result else None}
+
+
+def iter_game_records(path=DEFAULT_PATH):
+    '''
+    Stream (matchup, outcome, seconds) for the per-game records of a results store (results.json has none).
+    '''
+    if not path.endswith('.json') and os.path.exists(path):
+        with ResultsStore(path) as store:
+            yield from store.iter_all_games()
+
+
+def stream_aggregate(path=DEFAULT_PATH) -> dict:
+    '''
+    Aggregate the records at path in a single pass over its batches and games: {matchup: MatchupStats}, sorted by matchup.
+    Memory grows with the number of matchups, not with the number of batches or games.
+    '''
+    stats = {}
+    for batch in iter_batch_records(path):
+        stats.setdefault(batch['matchup'], MatchupStats()).add_batch(batch)
+    for key, _, seconds in iter_game_records(path):
+        stats.setdefault(key, MatchupStats()).add_game(seconds)
+    return dict(sorted(stats.items()))
+
+
+def _to_json(value):
+    return None if value is None else json.dumps(value, sort_keys=True, default=str)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Tic-Tac-Toe results store')
+    parser.add_argument('--store', default=DEFAULT_PATH, help='the results database')
+    parser.add_argument('--import-json', metavar='PATH', help='record the matchups of a results.json file')
+    parser.add_argument('--export-json', metavar='PATH', help='write the aggregate as a results.json file')
+    args = parser.parse_args()
+    with ResultsStore(args.store) as store:
+        if args.import_json:
+            print(f'Imported {store.import_json(args.import_json)} matchups from {args.import_json} into {args.store}')
+        if args.export_json:
+            store.export_json(args.export_json)
+            print(f'Wrote the aggregate of {args.store} to {args.export_json}')
@@ -1,18 +1,54 @@
 # simulate.py is for running the simulation (interactively).
 import datetime
-import json 
+import latency
 import main
 import players
-from time import time
+import random
+import results_store
+from time import perf_counter
 
 class TicTacToeSimulator:
-    def __init__(self, grid_size=3, num_episodes=100):
+    '''
+    TicTacToeSimulator: plays AI vs AI episodes and tabulates the results. 
+    
+                        With workers > 1, each batch of episodes is split into chunks of chunk_size 
+                        episodes, shared out among that many worker processes. Given a seed, every 
+                        chunk is seeded deterministically (from the seed, the matchup and the chunk's 
+                        position), so the results for a fixed seed and worker count are reproducible.
+
+                        Each batch is appended to the results store (see results_store.py) with its seed,
+                        grid size, worker count and the players' options (player_options, keyword arguments
+                        by player class name); with record_games, each game's outcome and time as well, and
+                        with record_latency, each player's decision time percentiles by ply (see latency.py).
+
+                        The board has grid_size rows and cols columns (by default, as many as rows), and the
+                        games are won by k in a row (by default, by filling a row, column or diagonal).
+                        player_classes holds the AI players that support the board (see BasePlayer.supports);
+                        the names of the others are listed in unsupported_players.
+    '''
+    def __init__(self, grid_size=3, num_episodes=100, workers=1, seed=None, chunk_size=100,
+                 results_path=results_store.DEFAULT_PATH, player_options=None, record_games=False, record_latency=False, k=None, cols=None):
         self.grid_size = grid_size
+        self.k = k
+        self.cols = cols
+        self.geometry = main.GridGeometry.for_size(grid_size, cols, k)
         self.num_episodes = num_episodes
-        self.player_classes = {
+        self.workers = workers
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.results_path = results_path
+        self.player_options = player_options or {}
+        self.record_games = record_games
+        self.record_latency = record_latency
+        player_classes = {
             'AI_Jack': players.AI_Jack,
             'AI_MCTS': players.AI_MCTS,
-            'AI_Rando': players.AI_Rando,}
+            'AI_ML_RL': players.AI_ML_RL,
+            'AI_Negamax': players.AI_Negamax,
+            'AI_Rando': players.AI_Rando,
+            'AI_Table': players.AI_Table,}
+        self.player_classes = {name: player_class for name, player_class in player_classes.items() if player_class.supports(self.geometry)}
+        self.unsupported_players = [name for name in player_classes if name not in self.player_classes]
         self.results = {'X': 0, 'O': 0, 'Draw': 0}
 
     # run the simulation for each pairing of players N times (incl A:A pairings)      
@@ -22,13 +58,10 @@ class TicTacToeSimulator:
                 # print the current player pairing with timestamp, as a progress indicator:
                 timestamp = datetime.datetime.now().strftime('%H:%M:%S:%f')[:-3]
                 print(f'{timestamp} Running {num_episodes} episodes of {player1} vs {player2}...')
-                time_begin = time()
                 new_results = self.simulate(self.player_classes[player1], self.player_classes[player2], num_episodes)
-                time_end = time()
-                time_elapsed = time_end - time_begin
-                avg_time_per_episode = (time_elapsed / num_episodes)
-                new_results['Time'] = round(avg_time_per_episode, 6)
-                self.save_results_as_json(self.player_classes[player1], self.player_classes[player2], new_results)
+                if 'Search' in new_results:
+                    print(f'{timestamp} Search stats: {new_results["Search"]}')
+                self.save_results(self.player_classes[player1], self.player_classes[player2], new_results)
 
     def display_menu(self):
         print('Tic-Tac-Toe AI vs AI Simulator')
@@ -74,14 +107,10 @@ class TicTacToeSimulator:
             for j, (o_name, o_class) in enumerate(self.player_classes.items()):
                 # include A-A matchups for the sake of completeness
                 print(f"Running simulation: {x_name}(X) vs {o_name}(O)")
-                time_begin = time()
-                self.simulate(x_class, o_class, num_episodes) 
-                time_end = time()
-                time_elapsed = time_end - time_begin
-                avg_time_per_episode = time_elapsed / num_episodes
-                new_results = self.return_results(x_class, o_class, avg_time_per_episode)
+                new_results = self.simulate(x_class, o_class, num_episodes) 
+                self.save_results(x_class, o_class, new_results)
+                new_results['matchup'] = f'Player X ({x_class.__name__}) vs. Player O ({o_class.__name__})'
                 print(new_results) # one set of pairing episodes completed
-                self.save_results_as_json(x_class, o_class, new_results)
                 
     def run_simulation(self):
         self.display_menu()
@@ -92,54 +121,146 @@ class TicTacToeSimulator:
         o_choice = self.get_player_assignment('Choose the AI player for O (enter the corresponding number): ')
         x_player_class = self.player_classes[list(self.player_classes.keys())[x_choice - 1]]
         o_player_class = self.player_classes[list(self.player_classes.keys())[o_choice - 1]]
-        time_begin = time()
-        for _ in range(self.num_episodes):
-            viewer = main.Simulation_Viewer(main.TicTacToeGame)
-            game = main.TicTacToeGame(grid_size=self.grid_size, simulation=True)
-            x_player = x_player_class('X', 'X', viewer, game)
-            o_player = o_player_class('O', 'O', viewer, game)
-            result = game.play_game(x_player, o_player, viewer)
-            self.results[result] += 1
-        time_end = time()
-        time_elapsed = time_end - time_begin
-        avg_time_per_episode = (time_elapsed / self.num_episodes)
+        episode_results = self.simulate(x_player_class, o_player_class, self.num_episodes)
+        for outcome in ('X', 'O', 'Draw'):
+            self.results[outcome] += episode_results[outcome]
+        avg_time_per_episode = episode_results['Time']
+        self.save_results(x_player_class, o_player_class, episode_results)
         
         new_results = self.return_results(x_player_class, o_player_class, avg_time_per_episode)
         print(new_results) # episodes completed
         print(f"Average time per episode: {avg_time_per_episode} seconds")
-        self.save_results_as_json(x_player_class, o_player_class, new_results)
 
-    def save_results_as_json(self, x_player_class, o_player_class, new_results):
-        results_file = 'results.json'
-        # First, if there are existing results in the json file, tabulate them
-        try:
-            with open(results_file, 'r') as f:
-                existing_results = json.load(f) # existing_results is a dictionary
-        except FileNotFoundError:
-            existing_results = {}
-        # Second, integrate the new results into the json file
-        key = f"{x_player_class.__name__}(X) vs. {o_player_class.__name__}(O)"
-        if key not in existing_results:
-            existing_results[key] = {"X": 0, "O": 0, "Draw": 0, "Time": 0}
-        existing_results[key]["X"] += new_results["X"]
-        existing_results[key]["O"] += new_results["O"]
-        existing_results[key]["Draw"] += new_results["Draw"]
-        # Only keep time data for the most recent simulation so as AIs improve their 
-        # performance, the time data will be updated apropriately
-        existing_results[key]["Time"] = new_results["Time"] 
-        with open(results_file, 'w') as f:
-            json.dump(existing_results, f, indent=4)
+    def save_results(self, x_player_class, o_player_class, new_results, extra=None):
+        '''
+        Append a batch (as returned by simulate(); its 'Games' are recorded and removed) to the results store,
+        with any extra details (a dict) recorded alongside.
+        '''
+        games = new_results.pop('Games', None)
+        extra = dict(extra or {})
+        if 'Search' in new_results:
+            extra['Search'] = new_results['Search']
+        with results_store.ResultsStore(self.results_path) as store:
+            store.record_batch(x_player_class.__name__, o_player_class.__name__, new_results, self.grid_size, self.seed, self.workers,
+                               self.player_options.get(x_player_class.__name__, {}), self.player_options.get(o_player_class.__name__, {}),
+                               games, extra or None, new_results.get('Latency'), self.geometry.cols, self.geometry.k,
+                               new_results.get('Latency histograms'))
 
     def simulate(self, x_class, o_class, num_episodes):
+        '''
+        Play num_episodes of x_class vs o_class (in worker processes if self.workers > 1); return 
+        {'X': wins, 'O': wins, 'Draw': draws, 'Time': average seconds per episode} (plus 'Search', see below,
+        with record_games, 'Games': [(outcome, seconds)] in chunk order, and with record_latency, 'Latency':
+        {player: {'all': percentiles, 'plies': {ply: percentiles}}}, see latency.LatencyRecorder.summary, and
+        'Latency histograms', the histograms behind them, which the results store merges across batches).
+        '''
+        chunks = self.plan_chunks(x_class, o_class, num_episodes)
+        options = (self.player_options.get(x_class.__name__, {}), self.player_options.get(o_class.__name__, {}), self.record_games, self.record_latency, self.k, self.cols)
+        if self.workers > 1 and len(chunks) > 1:
+            # a fixed share of the chunks per worker, so that worker-local state (e.g. AI_Negamax's table) is reproducible too
+            shares = [chunks[worker::self.workers] for worker in range(min(self.workers, len(chunks)))]
+            from concurrent.futures import ProcessPoolExecutor # imported here to keep single-process start-up fast
+            with ProcessPoolExecutor(max_workers=len(shares)) as pool:
+                parts = list(pool.map(_simulate_chunks, [self.grid_size] * len(shares), [x_class] * len(shares), [o_class] * len(shares), shares,
+                                      *([option] * len(shares) for option in options)))
+        else:
+            parts = [_simulate_chunks(self.grid_size, x_class, o_class, chunks, *options)]
         results = {'X': 0, 'O': 0, 'Draw': 0}
-        for _ in range(num_episodes):
+        search_stats = {}
+        latencies = latency.LatencyRecorder()
+        seconds = 0.0
+        for part_results, part_search_stats, part_seconds, _, part_latencies in parts:
+            for outcome in ('X', 'O', 'Draw'):
+                results[outcome] += part_results[outcome]
+            for player, moves in part_search_stats.items():
+                search_stats.setdefault(player, []).extend(moves)
+            seconds += part_seconds
+            if part_latencies is not None:
+                latencies.merge(part_latencies)
+        results['Time'] = round(seconds / num_episodes, 6) if num_episodes else 0.0
+        if search_stats:
+            results['Search'] = self.summarize_search_stats(search_stats)
+        if self.record_games:
+            # worker w played chunks w, w + workers, ...; put the games back in chunk order
+            chunk_games = [None] * len(chunks)
+            for worker, part in enumerate(parts):
+                chunk_games[worker::len(parts)] = part[3]
+            results['Games'] = [game for games in chunk_games for game in games]
+        if self.record_latency:
+            results['Latency'] = latencies.summary()
+            results['Latency histograms'] = latencies.to_json()
+        return results
+
+    def simulate_batch(self, x_class, o_class, num_episodes):
+        '''
+        As simulate(), but for players with a vectorized policy (AI_Rando, AI_Jack): all episodes are played 
+        in lock-step as NumPy arrays (see vectorized.simulate_batch); the tallies follow the same distribution.
+        '''
+        import vectorized # NumPy is only needed for batch simulation
+        for player_class in (x_class, o_class):
+            if player_class.__name__ not in vectorized.POLICIES:
+                raise ValueError(f'No batch policy for {player_class.__name__}; batch simulation supports {", ".join(vectorized.POLICIES)}')
+        seed = None if self.seed is None else random.Random(f'{self.seed}:{self.grid_size}:{x_class.__name__}:{o_class.__name__}:batch').getrandbits(64)
+        time_begin = perf_counter()
+        results = vectorized.simulate_batch(self.geometry, x_class.__name__, o_class.__name__, num_episodes, seed)
+        results['Time'] = round((perf_counter() - time_begin) / num_episodes, 9) if num_episodes else 0.0
+        return results
+
+    def plan_chunks(self, x_class, o_class, num_episodes):
+        '''
+        Split num_episodes into [(episodes, seed)] chunks; without a seed (and one worker) it is a single, unseeded chunk.
+        '''
+        if self.seed is None and self.workers <= 1:
+            return [(num_episodes, None)]
+        sizes = [self.chunk_size] * (num_episodes // self.chunk_size) + ([num_episodes % self.chunk_size] if num_episodes % self.chunk_size else [])
+        if self.seed is None:
+            return [(size, None) for size in sizes]
+        chunk_seeds = random.Random(f'{self.seed}:{self.grid_size}:{x_class.__name__}:{o_class.__name__}')
+        return [(size, chunk_seeds.getrandbits(64)) for size in sizes]
+
+    @staticmethod
+    def summarize_search_stats(search_stats):
+        '''
+        Average the per-move search statistics of each searching player, e.g. {'AI_MCTS(X)': {'moves': 412, 'inherited_visits': 88.1}}
+        '''
+        summary = {}
+        for player, moves in search_stats.items():
+            summary[player] = {'moves': len(moves)}
+            for key in moves[0] if moves else ():
+                summary[player][key] = round(sum(move[key] for move in moves) / len(moves), 2)
+        return summary
+
+
+def _simulate_chunks(grid_size, x_class, o_class, chunks, x_kwargs=None, o_kwargs=None, record_games=False, record_latency=False, k=None, cols=None):
+    '''
+    Play the episodes of each (episodes, seed) chunk, seeding the random module first if given a seed;
+    return ({'X': wins, 'O': wins, 'Draw': draws}, {player: [search stats per move]}, seconds,
+    [[(outcome, seconds) per game] per chunk] if record_games else None, a LatencyRecorder if record_latency else None).
+    '''
+    results = {'X': 0, 'O': 0, 'Draw': 0}
+    search_stats = {}
+    chunk_games = [] if record_games else None
+    latencies = latency.LatencyRecorder() if record_latency else None
+    time_begin = perf_counter()
+    for episodes, seed in chunks:
+        if seed is not None:
+            random.seed(seed)
+        if record_games:
+            chunk_games.append([])
+        for _ in range(episodes):
+            game_begin = perf_counter()
             viewer = main.Simulation_Viewer(main.TicTacToeGame)
-            game = main.TicTacToeGame(grid_size=self.grid_size, simulation=True)
-            x_player = x_class('X', 'X', viewer, game)
-            o_player = o_class('O', 'O', viewer, game)
-            result = game.play_game(x_player, o_player, viewer)
+            game = main.TicTacToeGame(grid_size=grid_size, simulation=True, cols=cols, k=k)
+            x_player = x_class('X', 'X', viewer, game, **(x_kwargs or {}))
+            o_player = o_class('O', 'O', viewer, game, **(o_kwargs or {}))
+            result = game.play_game(x_player, o_player, viewer, latencies)
             results[result] += 1
-        return results
+            if record_games:
+                chunk_games[-1].append((result, round(perf_counter() - game_begin, 6)))
+            for player in (x_player, o_player):
+                if hasattr(player, 'search_stats'):
+                    search_stats.setdefault(f'{type(player).__name__}({player.player_symbol})', []).extend(player.search_stats)
+    return results, search_stats, perf_counter() - time_begin, chunk_games, latencies
 
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+# tablebase.py - the solved 3x3 game as a memory-mapped table: the reference opponent (AI_Table) and ground truth for grading AIs.
+import mmap
+import os
+import struct
+import sys
+from array import array
+from atomic_file import atomic_write
+
+MAGIC = b'TTTB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBH') # magic, version, grid_size, reserved
+ENTRY = struct.Struct('<H')
+REACHABLE = 1 << 15 # entry bits: 15 reachable, 9-10 value + 1 (for the player to move), 0-8 best moves (bit i is cell i + 1)
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebase_3x3.bin')
+
+_open_tables = {}
+
+
+class Tablebase:
+    '''
+    Tablebase:  a memory-mapped table holding, for every position reachable from the empty board, its
+                game-theoretic value for the player to move (1 win, 0 draw, -1 loss) and its best moves.
+                Positions are indexed by their base-3 encoding (cell i contributes 3**i for X, 2 * 3**i
+                for O), a perfect index over all boards, so a lookup is a single read.
+    '''
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.grid_size, _ = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} tablebase')
+        self.ternary = ternary_table(self.grid_size * self.grid_size)
+
+    def lookup(self, x_mask: int, o_mask: int):
+        '''
+        Return (value, best moves) for the position, or None if it cannot arise in play.
+        '''
+        entry = ENTRY.unpack_from(self.mmap, HEADER.size + ENTRY.size * (self.ternary[x_mask] + 2 * self.ternary[o_mask]))[0]
+        if not entry & REACHABLE:
+            return None
+        moves = [cell + 1 for cell in range(9) if entry >> cell & 1]
+        return (entry >> 9 & 3) - 1, moves
+
+    def is_best_move(self, x_mask: int, o_mask: int, move: int) -> bool:
+        entry = self.lookup(x_mask, o_mask)
+        return entry is not None and move in entry[1]
+
+
+def load(path=DEFAULT_PATH, geometry=None) -> Tablebase:
+    '''
+    Return the (shared, memory-mapped) tablebase at path, generating it for geometry first if the file does not exist.
+    '''
+    if path not in _open_tables:
+        if not os.path.exists(path):
+            generate(geometry, path)
+        _open_tables[path] = Tablebase(path)
+    return _open_tables[path]
+
+
+def ternary_table(cells):
+    '''
+    Return, for every cell bitmask, the sum of 3**i over its set bits (so a board's index is table[x] + 2 * table[o]).
+    '''
+    table = [0] * (1 << cells)
+    for mask in range(1, 1 << cells):
+        low_bit = mask & -mask
+        table[mask] = table[mask ^ low_bit] + 3 ** (low_bit.bit_length() - 1)
+    return table
+
+
+def generate(geometry, path=DEFAULT_PATH):
+    '''
+    Solve every reachable position of geometry's board (only 3x3 is supported), searching one position per
+    symmetry class, and write the table for all of them to path; return (reachable positions, classes).
+    '''
+    if geometry is None or geometry.key != (3, 3, 3):
+        raise ValueError('The tablebase is only practical (and encodable) for 3x3 tic-tac-toe')
+    values = {} # canonical position -> value for the player to move
+
+    def canonical(x_mask, o_mask):
+        return geometry.canonical(x_mask, o_mask)[0]
+
+    def is_won(mask):
+        return any(mask & line == line for line in geometry.win_masks)
+
+    def children(x_mask, o_mask):
+        x_to_move = bin(x_mask).count('1') == bin(o_mask).count('1')
+        empty = geometry.full_mask & ~(x_mask | o_mask)
+        for cell in range(geometry.cells):
+            if empty >> cell & 1:
+                yield cell + 1, (x_mask | 1 << cell, o_mask) if x_to_move else (x_mask, o_mask | 1 << cell)
+
+    def solve(x_mask, o_mask):
+        key = canonical(x_mask, o_mask)
+        if key not in values:
+            if is_won(x_mask) or is_won(o_mask):
+                values[key] = -1 # the previous player completed a line
+            elif x_mask | o_mask == geometry.full_mask:
+                values[key] = 0
+            else:
+                values[key] = max(-solve(*child) for _, child in children(x_mask, o_mask))
+        return values[key]
+
+    solve(0, 0)
+    ternary = ternary_table(geometry.cells)
+    entries = array('H', [0]) * (3 ** geometry.cells)
+    for x_mask, o_mask in values:
+        value = values[(x_mask, o_mask)]
+        best_moves = 0
+        if not (is_won(x_mask) or is_won(o_mask)):
+            for move, child in children(x_mask, o_mask):
+                if -values[canonical(*child)] == value:
+                    best_moves |= 1 << (move - 1)
+        for symmetry in geometry.symmetries:
+            image_x, image_o = geometry.transform_mask(x_mask, symmetry), geometry.transform_mask(o_mask, symmetry)
+            entries[ternary[image_x] + 2 * ternary[image_o]] = REACHABLE | (value + 1) << 9 | geometry.transform_mask(best_moves, symmetry)
+    positions = sum(1 for entry in entries if entry & REACHABLE)
+    if sys.byteorder != 'little':
+        entries.byteswap()
+    with atomic_write(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, geometry.grid_size, 0))
+        f.write(entries.tobytes())
+    return positions, len(values)
+
+
+if __name__ == '__main__':
+    import main
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    positions, classes = generate(main.GridGeometry.for_size(3), path)
+    print(f'Wrote {path}: {positions} reachable positions ({classes} up to symmetry), {os.path.getsize(path)} bytes')
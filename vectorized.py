@@ -0,0 +1,136 @@
+# vectorized.py - NumPy implementations that play many games at once, for the AIs and the simulator.
+import numpy as np
+
+
+EMPTY, X, O = 0, 1, 2
+SYMBOLS = {'X': X, 'O': O}
+
+
+class BoardArrays:
+    '''
+    BoardArrays:    a GridGeometry as NumPy arrays; boards are (games, cells) int8 arrays of EMPTY/X/O.
+
+                    lines       - (lines, line length) the cell indices of every win line
+                    incidence   - (lines, cells) 1 where the cell is on the line
+                    scores      - (cells,) the score_matrix, flattened
+    '''
+    def __init__(self, geometry) -> None:
+        self.geometry = geometry
+        self.lines = np.array([[cell for cell in range(geometry.cells) if mask >> cell & 1] for mask in geometry.win_masks], dtype=np.intp)
+        self.line_length = self.lines.shape[1]
+        self.incidence = np.zeros((len(geometry.win_masks), geometry.cells), dtype=np.int16)
+        self.incidence[np.repeat(np.arange(len(self.lines)), self.line_length), self.lines.ravel()] = 1
+        self.scores = np.array([score for row in geometry.score_matrix for score in row], dtype=np.int16)
+
+
+def random_policy(boards, player, arrays, rng):
+    '''
+    AI_Rando: a uniformly random empty cell of each board.
+    '''
+    return np.argmax(rng.random(boards.shape) * (boards == EMPTY), axis=1)
+
+
+def score_policy(boards, player, arrays, rng, candidates=None):
+    '''
+    A uniformly random choice among the candidate cells (default: the empty cells) with the highest score;
+    the MCTS rollout policy, and AI_Jack's fallback.
+    '''
+    if candidates is None:
+        candidates = boards == EMPTY
+    weights = np.where(candidates, arrays.scores, -1)
+    best = weights == weights.max(axis=1, keepdims=True)
+    return np.argmax(rng.random(boards.shape) * best, axis=1)
+
+
+def jack_policy(boards, player, arrays, rng):
+    '''
+    AI_Jack: the first (lowest) winning cell; else the best-scoring blocking cells; else the best-scoring empty cells.
+    '''
+    empty = boards == EMPTY
+    on_lines = boards[:, arrays.lines]
+    mine = (on_lines == player).sum(axis=2)
+    theirs = (on_lines == X + O - player).sum(axis=2)
+    one_short = arrays.line_length - 1
+    winning = empty & (((mine == one_short) & (theirs == 0)).astype(np.int16) @ arrays.incidence > 0)
+    blocking = empty & (((theirs == one_short) & (mine == 0)).astype(np.int16) @ arrays.incidence > 0)
+    has_win = winning.any(axis=1)
+    has_block = blocking.any(axis=1)
+    candidates = np.where(has_block[:, None], blocking, empty)
+    return np.where(has_win, np.argmax(winning, axis=1), score_policy(boards, player, arrays, rng, candidates))
+
+
+POLICIES = {'AI_Rando': random_policy, 'AI_Jack': jack_policy}
+
+
+class BatchRollout:
+    '''
+    BatchRollout:   plays batch_size random rollouts from one position simultaneously, as a
+                    (batch_size, cells) board array advanced one ply per step (all games share
+                    the player to move), with finished games masked out.
+
+                    __call__(self, state) - the mean result of the rollouts from state for the
+                                            player to move: 1 win, 0.5 draw, 0 loss
+
+    Moves follow AI_MCTS.rollout's policy: a uniformly random choice among the empty cells
+    with the highest score_matrix value.
+    '''
+    def __init__(self, geometry, batch_size, seed=None):
+        self.geometry = geometry
+        self.batch_size = batch_size
+        self.arrays = BoardArrays(geometry)
+        self.bits = np.arange(geometry.cells, dtype=object)
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, state) -> float:
+        if state.outcome is not None:
+            return 1 if state.outcome == state.current_player else 0.5 if state.outcome == 'Draw' else 0
+        player = SYMBOLS[state.current_player]
+        boards = np.tile(self.start_board(state.masks['X'], state.masks['O']), (self.batch_size, 1))
+        outcomes = play_out(boards, player, {X: score_policy, O: score_policy}, self.arrays, self.rng)
+        return float(np.mean((outcomes == player) + 0.5 * (outcomes == EMPTY)))
+
+    def start_board(self, x_mask, o_mask):
+        board = np.zeros(self.geometry.cells, dtype=np.int8)
+        board[((x_mask >> self.bits) & 1).astype(bool)] = X
+        board[((o_mask >> self.bits) & 1).astype(bool)] = O
+        return board
+
+
+def play_out(boards, player, policies, arrays, rng):
+    '''
+    Play every board of boards (modified in place) to the end, player (X or O) moving first and each side
+    choosing with its policy from policies ({X: policy, O: policy}); return each game's winner (X or O),
+    or EMPTY for a draw.
+    '''
+    games = boards.shape[0]
+    outcomes = np.full(games, EMPTY, dtype=np.int8)
+    active = np.arange(games)
+    while active.size:
+        board = boards[active]
+        cells = policies[player](board, player, arrays, rng)
+        board[np.arange(active.size), cells] = player
+        boards[active] = board
+        won = (board[:, arrays.lines] == player).all(axis=2).any(axis=1)
+        outcomes[active[won]] = player
+        full = ~(board == EMPTY).any(axis=1)
+        active = active[~(won | full)]
+        player = X + O - player
+    return outcomes
+
+
+def simulate_batch(geometry, x_policy, o_policy, num_games, seed=None, batch_size=100_000):
+    '''
+    Play num_games games from the empty board with the named policies (see POLICIES) in lock-step,
+    batch_size games at a time; return {'X': wins, 'O': wins, 'Draw': draws}.
+    '''
+    arrays = BoardArrays(geometry)
+    policies = {X: POLICIES[x_policy], O: POLICIES[o_policy]}
+    rng = np.random.default_rng(seed)
+    results = {'X': 0, 'O': 0, 'Draw': 0}
+    for start in range(0, num_games, batch_size):
+        boards = np.zeros((min(batch_size, num_games - start), geometry.cells), dtype=np.int8)
+        outcomes = play_out(boards, X, policies, arrays, rng)
+        results['X'] += int(np.count_nonzero(outcomes == X))
+        results['O'] += int(np.count_nonzero(outcomes == O))
+        results['Draw'] += int(np.count_nonzero(outcomes == EMPTY))
+    return results